@@ -33,6 +33,25 @@ assert any(app in INSTALLED_APPS for app in ['posts.apps.PostsConfig', 'posts'])
     'Пожалуйста зарегистрируйте приложение в `settings.INSTALLED_APPS`'
 )
 
+import pytest
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_environment():
+    """Тесты не трогают файл кеша сайта (как IsolatedCacheRunner)."""
+    from core.testing import isolated_environment
+    with isolated_environment():
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(isolated_environment):
+    """Версии кеша меняются после коммита, которого в тестах нет,
+    поэтому закешированные страницы сбрасываются перед каждым тестом."""
+    from django.core.cache import cache
+    cache.clear()
+
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
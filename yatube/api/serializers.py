@@ -0,0 +1,96 @@
+from django.core.files.storage import default_storage
+
+from posts.cache import post_row_namespaces
+from posts.thumbnails import get_ready_thumbnails
+
+# Поля ``values()``, из которых собираются посты и комментарии API.
+POST_VALUES = (
+    'id', 'text', 'pub_date', 'author__username', 'group__slug',
+    'comments_count', 'image',
+)
+SYNC_VALUES = (
+    'id', 'updated', 'pub_date', 'author__username', 'group__slug',
+    'comments_count',
+)
+COMMENT_VALUES = ('id', 'text', 'created', 'author__username')
+GROUP_VALUES = ('slug', 'title', 'description', 'posts_count')
+PROFILE_VALUES = (
+    'username', 'first_name', 'last_name', 'counters__posts_count',
+    'counters__followers_count', 'counters__following_count',
+)
+
+THUMBNAIL_ALIAS = 'card'
+
+
+def _image(name, thumbnails):
+    if not name:
+        return None
+    thumbnail = thumbnails.get((name, THUMBNAIL_ALIAS))
+    return {
+        'url': default_storage.url(name),
+        'thumbnail': thumbnail.url if thumbnail is not None else None,
+    }
+
+
+def serialize_posts(rows):
+    """Посты из строк ``values(*POST_VALUES)``; миниатюры всех постов
+    ищутся одним пакетом."""
+    thumbnails = get_ready_thumbnails(
+        [row['image'] for row in rows],
+        (THUMBNAIL_ALIAS,),
+        {
+            row['image']: post_row_namespaces(
+                row['id'], row['author__username'], row['group__slug'],
+            )
+            for row in rows if row['image']
+        },
+    )
+    return [
+        {
+            'id': row['id'],
+            'text': row['text'],
+            'pub_date': row['pub_date'],
+            'author': row['author__username'],
+            'group': row['group__slug'],
+            'comments_count': row['comments_count'],
+            'image': _image(row['image'], thumbnails),
+        }
+        for row in rows
+    ]
+
+
+def serialize_sync(rows):
+    """Минимальные поля измененных постов для delta-sync."""
+    return [
+        {
+            'id': row['id'],
+            'updated': row['updated'],
+            'pub_date': row['pub_date'],
+            'author': row['author__username'],
+            'group': row['group__slug'],
+            'comments_count': row['comments_count'],
+        }
+        for row in rows
+    ]
+
+
+def serialize_comments(rows):
+    return [
+        {
+            'id': row['id'],
+            'text': row['text'],
+            'created': row['created'],
+            'author': row['author__username'],
+        }
+        for row in rows
+    ]
+
+
+def serialize_profile(row):
+    return {
+        'username': row['username'],
+        'full_name': f"{row['first_name']} {row['last_name']}".strip(),
+        'posts_count': row['counters__posts_count'] or 0,
+        'followers_count': row['counters__followers_count'] or 0,
+        'following_count': row['counters__following_count'] or 0,
+    }
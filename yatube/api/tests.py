@@ -0,0 +1,334 @@
+import base64
+import json
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from core.testing import execute_on_commit
+from posts.models import Comment, Follow, Group, Post
+from posts.thumbnails import schedule_thumbnails
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+RAW_IMAGE = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+# Курсоры, которые декодируются, но содержат невозможные значения.
+MALFORMED_CURSORS = {
+    'bad_date': ['2020-13-45T10:00:00+00:00', 1],
+    'naive_date': ['2020-01-01T10:00:00', 1],
+    'bad_id': ['2020-01-01T10:00:00+00:00', 'abc'],
+    'null_id': ['2020-01-01T10:00:00+00:00', None],
+    'list_id': ['2020-01-01T10:00:00+00:00', [1]],
+}
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ApiTests(TestCase):
+    """Тестирование read-only JSON API."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='TestUser', first_name='Test', last_name='User',
+        )
+        cls.reader = User.objects.create_user(username='TestReader')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.group = Group.objects.create(
+            title='TestTitle',
+            slug='test_slug',
+            description='TestDescription',
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'TestText{number}', author=cls.user, group=cls.group,
+            )
+            for number in range(settings.POSTS_PER_PAGE + 2)
+        ]
+        cls.comment = Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='TestComment',
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_posts_cursor_pagination(self):
+        response = self.client.get(reverse('api:posts'))
+        data = response.json()
+        self.assertEqual(
+            [post['id'] for post in data['results']],
+            [post.pk for post in self.posts[::-1][:settings.POSTS_PER_PAGE]],
+        )
+        self.assertIsNone(data['previous'])
+        data = self.client.get(data['next']).json()
+        self.assertEqual(
+            [post['id'] for post in data['results']],
+            [post.pk for post in self.posts[1::-1]],
+        )
+        self.assertIsNone(data['next'])
+
+    def test_post_fields(self):
+        post = self.posts[0]
+        data = self.client.get(
+            reverse('api:post', kwargs={'post_id': post.pk})
+        ).json()
+        self.assertEqual(data['author'], self.user.get_username())
+        self.assertEqual(data['group'], self.group.slug)
+        self.assertEqual(data['comments_count'], 1)
+        self.assertIsNone(data['image'])
+
+    def test_post_image_thumbnail(self):
+        post = Post.objects.create(
+            text='TestImage',
+            author=self.user,
+            image=SimpleUploadedFile(
+                name='ApiImage.gif', content=RAW_IMAGE,
+                content_type='image/gif',
+            ),
+        )
+        url = reverse('api:post', kwargs={'post_id': post.pk})
+        image = self.client.get(url).json()['image']
+        self.assertEqual(image['url'], post.image.url)
+        self.assertIsNone(image['thumbnail'])
+        with execute_on_commit():
+            schedule_thumbnails(post.image.name, [f'post:{post.pk}'])
+        image = self.client.get(url).json()['image']
+        self.assertTrue(image['thumbnail'].startswith(settings.MEDIA_URL))
+
+    def test_related_endpoints(self):
+        cases = (
+            (reverse('api:groups'), 'results', 1),
+            (reverse('api:group_posts', kwargs={'slug': self.group.slug}),
+             'results', settings.POSTS_PER_PAGE),
+            (reverse(
+                'api:comments', kwargs={'post_id': self.posts[0].pk}
+            ), 'results', 1),
+            (reverse(
+                'api:profile_posts',
+                kwargs={'username': self.user.get_username()},
+            ), 'results', settings.POSTS_PER_PAGE),
+        )
+        for url, key, count in cases:
+            with self.subTest(url=url):
+                self.assertEqual(len(self.client.get(url).json()[key]), count)
+        group = self.client.get(
+            reverse('api:group', kwargs={'slug': self.group.slug})
+        ).json()
+        self.assertEqual(group['posts_count'], len(self.posts))
+        profile = self.client.get(
+            reverse(
+                'api:profile', kwargs={'username': self.user.get_username()},
+            )
+        ).json()
+        self.assertEqual(profile['full_name'], 'Test User')
+        self.assertEqual(profile['posts_count'], len(self.posts))
+        self.assertEqual(profile['followers_count'], 1)
+
+    def test_errors(self):
+        cases = (
+            (reverse('api:post', kwargs={'post_id': 0}), 404),
+            (reverse('api:group_posts', kwargs={'slug': 'unknown'}), 404),
+            (reverse('api:profile', kwargs={'username': 'unknown'}), 404),
+            (reverse('api:posts') + '?before=invalid', 400),
+        )
+        for url, status in cases:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('detail', response.json())
+
+    def test_malformed_cursors(self):
+        """Декодируемый курсор с невозможными значениями - 400 с JSON."""
+        urls = (
+            reverse('api:posts'),
+            reverse('api:group_posts', kwargs={'slug': self.group.slug}),
+            reverse(
+                'api:profile_posts',
+                kwargs={'username': self.user.get_username()},
+            ),
+        )
+        for url in urls:
+            for name, values in MALFORMED_CURSORS.items():
+                with self.subTest(url=url, cursor=name):
+                    response = self.client.get(
+                        url, {'before': encode_cursor(values)},
+                    )
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('detail', response.json())
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('api:posts'))
+        self.assertLessEqual(len(queries), 3)
+
+    def test_cached_and_invalidated(self):
+        """API кешируется и сбрасывается вместе со страницами сайта."""
+        url = reverse('api:posts')
+        response = self.client.get(url)
+        Post.objects.filter(pk=self.posts[-1].pk).update(text='Changed')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).content, response.content)
+            not_modified = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'],
+            )
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(not_modified.status_code, 304)
+        with execute_on_commit():
+            Post.objects.create(text='NewText', author=self.user)
+        data = self.client.get(url).json()
+        self.assertEqual(data['results'][0]['text'], 'NewText')
+
+    def test_views_within_query_budget(self):
+        """Число запросов не превышает ``query_budget`` view."""
+        self.client.force_login(self.reader)
+        post_id = {'post_id': self.posts[0].pk}
+        slug = {'slug': self.group.slug}
+        username = {'username': self.user.get_username()}
+        urls = (
+            reverse('api:posts'),
+            reverse('api:post', kwargs=post_id),
+            reverse('api:comments', kwargs=post_id),
+            reverse('api:groups'),
+            reverse('api:group', kwargs=slug),
+            reverse('api:group_posts', kwargs=slug),
+            reverse('api:profile', kwargs=username),
+            reverse('api:profile_posts', kwargs=username),
+            reverse('api:sync_posts'),
+            reverse('api:sync_group_posts', kwargs=slug),
+            reverse('api:sync_follow'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(
+                    len(queries), resolve(url).func.view_class.query_budget,
+                )
+
+    def test_read_only(self):
+        response = self.client.post(reverse('api:posts'))
+        self.assertEqual(response.status_code, 405)
+
+    def test_sync_returns_changes_after_cursor(self):
+        url = reverse('api:sync_posts')
+        cursor = self.client.get(url).json()['cursor']
+        post = self.posts[0]
+        post.text = 'Edited'
+        with execute_on_commit():
+            post.save()
+        data = self.client.get(url, {'since': cursor}).json()
+        self.assertEqual(
+            [(row['id'], row['updated'] is not None)
+             for row in data['results']],
+            [(post.pk, True)],
+        )
+        self.assertFalse(data['has_more'])
+        data = self.client.get(url, {'since': data['cursor']}).json()
+        self.assertEqual(data['results'], [])
+
+    def test_sync_pages_through_changes(self):
+        url = reverse('api:sync_posts')
+        cursor = self.client.get(url).json()['cursor']
+        with execute_on_commit():
+            created = [
+                Post.objects.create(text=f'New{number}', author=self.user)
+                for number in range(3)
+            ]
+        received = []
+        with self.settings(SYNC_MAX_ITEMS=2):
+            while True:
+                data = self.client.get(url, {'since': cursor}).json()
+                received += [row['id'] for row in data['results']]
+                cursor = data['cursor']
+                if not data['has_more']:
+                    break
+        self.assertEqual(received, [post.pk for post in created])
+
+    def test_sync_nothing_new_does_not_query_posts(self):
+        url = reverse('api:sync_posts')
+        cursor = self.client.get(url).json()['cursor']
+        self.client.get(url, {'since': cursor})
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(url, {'since': cursor}).json()
+        self.assertEqual(data, {
+            'results': [], 'cursor': cursor, 'has_more': False,
+        })
+        self.assertFalse(
+            [query for query in queries if 'posts_post' in query['sql']]
+        )
+
+    def test_sync_scopes(self):
+        other = User.objects.create_user(username='TestOther')
+        group_url = reverse(
+            'api:sync_group_posts', kwargs={'slug': self.group.slug},
+        )
+        follow_url = reverse('api:sync_follow')
+        self.client.force_login(self.reader)
+        cursors = {
+            url: self.client.get(url).json()['cursor']
+            for url in (group_url, follow_url)
+        }
+        with execute_on_commit():
+            Post.objects.create(text='Foreign', author=other)
+            post = Post.objects.create(
+                text='Own', author=self.user, group=self.group,
+            )
+        for url, cursor in cursors.items():
+            with self.subTest(url=url):
+                data = self.client.get(url, {'since': cursor}).json()
+                self.assertEqual(
+                    [row['id'] for row in data['results']], [post.pk],
+                )
+
+    def test_sync_malformed_since(self):
+        """Невозможные значения в курсоре ``since`` дают 400, а не 500."""
+        url = reverse('api:sync_posts')
+        self.client.get(url)
+        for name, values in MALFORMED_CURSORS.items():
+            with self.subTest(cursor=name):
+                response = self.client.get(
+                    url, {'since': encode_cursor(values)},
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('detail', response.json())
+
+    def test_sync_errors(self):
+        cases = (
+            (reverse('api:sync_posts') + '?since=invalid', 400),
+            (reverse('api:sync_group_posts', kwargs={'slug': 'unknown'}),
+             404),
+            (reverse('api:sync_follow'), 401),
+        )
+        for url, status in cases:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('detail', response.json())
@@ -0,0 +1,63 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path(
+        'v1/posts/',
+        views.PostListApiView.as_view(),
+        name='posts',
+    ),
+    path(
+        'v1/posts/<int:post_id>/',
+        views.PostDetailApiView.as_view(),
+        name='post',
+    ),
+    path(
+        'v1/posts/<int:post_id>/comments/',
+        views.CommentListApiView.as_view(),
+        name='comments',
+    ),
+    path(
+        'v1/sync/posts/',
+        views.PostSyncIndexApiView.as_view(),
+        name='sync_posts',
+    ),
+    path(
+        'v1/sync/groups/<slug:slug>/posts/',
+        views.PostSyncGroupApiView.as_view(),
+        name='sync_group_posts',
+    ),
+    path(
+        'v1/sync/follow/',
+        views.PostSyncFollowApiView.as_view(),
+        name='sync_follow',
+    ),
+    path(
+        'v1/groups/',
+        views.GroupListApiView.as_view(),
+        name='groups',
+    ),
+    path(
+        'v1/groups/<slug:slug>/',
+        views.GroupDetailApiView.as_view(),
+        name='group',
+    ),
+    path(
+        'v1/groups/<slug:slug>/posts/',
+        views.GroupPostListApiView.as_view(),
+        name='group_posts',
+    ),
+    path(
+        'v1/profiles/<str:username>/',
+        views.ProfileApiView.as_view(),
+        name='profile',
+    ),
+    path(
+        'v1/profiles/<str:username>/posts/',
+        views.ProfilePostListApiView.as_view(),
+        name='profile_posts',
+    ),
+]
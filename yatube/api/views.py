@@ -0,0 +1,335 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse
+from django.views.generic.base import View
+
+from posts.cache import (
+    group_namespace, groups_namespace, high_water_mark, index_namespace,
+    post_namespace, profile_namespace, public_cached_response,
+)
+from posts.models import Comment, Follow, Group, Post, User
+from posts.paginators import CursorPaginator, InvalidCursor
+
+from .serializers import (
+    COMMENT_VALUES, GROUP_VALUES, POST_VALUES, PROFILE_VALUES, SYNC_VALUES,
+    serialize_comments, serialize_posts, serialize_profile, serialize_sync,
+)
+
+API_KEY_PREFIX = 'api:v1'
+# Компактный JSON: без пробелов и без экранирования кириллицы.
+JSON_DUMPS_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+
+
+class ApiView(View):
+    """Read-only endpoint API: JSON, закешированный по версиям данных.
+
+    Инвалидация общая со страницами сайта: те же пространства имен
+    сбрасываются сигналами при изменении постов, комментариев и групп.
+    """
+    http_method_names = ['get', 'head', 'options']
+    query_budget = 2
+
+    def get_cache_namespaces(self):
+        raise NotImplementedError(
+            'Определите get_cache_namespaces() в подклассе.'
+        )
+
+    def get_data(self):
+        raise NotImplementedError('Определите get_data() в подклассе.')
+
+    def get(self, request, *args, **kwargs):
+        return public_cached_response(
+            request, self.get_cache_namespaces(), self.render,
+            API_KEY_PREFIX,
+        )
+
+    def render(self):
+        try:
+            data = self.get_data()
+        except Http404 as e:
+            return self.error(str(e) or 'Не найдено.', 404)
+        except InvalidCursor as e:
+            return self.error(str(e), 400)
+        return JsonResponse(
+            data,
+            encoder=DjangoJSONEncoder,
+            json_dumps_params=JSON_DUMPS_PARAMS,
+        )
+
+    @staticmethod
+    def error(detail, status):
+        return JsonResponse(
+            {'detail': detail},
+            status=status,
+            json_dumps_params=JSON_DUMPS_PARAMS,
+        )
+
+
+class CursorListApiView(ApiView):
+    """Список с keyset-пагинацией по ``?before=``/``?after=``."""
+    ordering = ('-pub_date', '-id')
+    per_page = settings.POSTS_PER_PAGE
+
+    def get_queryset(self):
+        raise NotImplementedError('Определите get_queryset() в подклассе.')
+
+    def serialize(self, rows):
+        return serialize_posts(rows)
+
+    def get_data(self):
+        paginator = CursorPaginator(
+            self.get_queryset(), self.per_page, ordering=self.ordering,
+        )
+        page = paginator.page(
+            before=self.request.GET.get('before'),
+            after=self.request.GET.get('after'),
+        )
+        return {
+            'results': self.serialize(list(page)),
+            'next': self.page_url('before', page.next_cursor),
+            'previous': self.page_url('after', page.previous_cursor),
+        }
+
+    def page_url(self, param, cursor):
+        if cursor is None:
+            return None
+        return f'{self.request.path}?{urlencode({param: cursor})}'
+
+
+def _get_row(queryset, fields):
+    row = queryset.values(*fields).first()
+    if row is None:
+        raise Http404
+    return row
+
+
+class PostListApiView(CursorListApiView):
+    """Все посты, как на главной странице."""
+
+    def get_cache_namespaces(self):
+        return [index_namespace()]
+
+    def get_queryset(self):
+        return Post.objects.values(*POST_VALUES)
+
+
+class PostDetailApiView(ApiView):
+
+    def get_cache_namespaces(self):
+        return [post_namespace(self.kwargs['post_id'])]
+
+    def get_data(self):
+        row = _get_row(
+            Post.objects.filter(pk=self.kwargs['post_id']), POST_VALUES,
+        )
+        return serialize_posts([row])[0]
+
+
+class CommentListApiView(CursorListApiView):
+    """Комментарии поста в порядке добавления."""
+    ordering = ('created', 'id')
+    per_page = settings.COMMENTS_PER_PAGE
+
+    def get_cache_namespaces(self):
+        return [post_namespace(self.kwargs['post_id'])]
+
+    def get_queryset(self):
+        if not Post.objects.filter(pk=self.kwargs['post_id']).exists():
+            raise Http404
+        return Comment.objects.filter(
+            post_id=self.kwargs['post_id'],
+        ).values(*COMMENT_VALUES)
+
+    def serialize(self, rows):
+        return serialize_comments(rows)
+
+
+class GroupListApiView(ApiView):
+
+    def get_cache_namespaces(self):
+        # Число постов групп меняется вместе с любым постом.
+        return [groups_namespace(), index_namespace()]
+
+    def get_data(self):
+        return {
+            'results': list(
+                Group.objects.order_by('title').values(*GROUP_VALUES)
+            ),
+        }
+
+
+class GroupDetailApiView(ApiView):
+
+    def get_cache_namespaces(self):
+        return [group_namespace(self.kwargs['slug'])]
+
+    def get_data(self):
+        return _get_row(
+            Group.objects.filter(slug=self.kwargs['slug']), GROUP_VALUES,
+        )
+
+
+class GroupPostListApiView(CursorListApiView):
+
+    def get_cache_namespaces(self):
+        return [group_namespace(self.kwargs['slug'])]
+
+    def get_queryset(self):
+        if not Group.objects.filter(slug=self.kwargs['slug']).exists():
+            raise Http404
+        return Post.objects.filter(
+            group__slug=self.kwargs['slug'],
+        ).values(*POST_VALUES)
+
+
+class ProfileApiView(ApiView):
+
+    def get_cache_namespaces(self):
+        return [profile_namespace(self.kwargs['username'])]
+
+    def get_data(self):
+        return serialize_profile(_get_row(
+            User.objects.filter(username=self.kwargs['username']),
+            PROFILE_VALUES,
+        ))
+
+
+class ProfilePostListApiView(CursorListApiView):
+
+    def get_cache_namespaces(self):
+        return [profile_namespace(self.kwargs['username'])]
+
+    def get_queryset(self):
+        if not User.objects.filter(username=self.kwargs['username']).exists():
+            raise Http404
+        return Post.objects.filter(
+            author__username=self.kwargs['username'],
+        ).values(*POST_VALUES)
+
+
+class PostSyncApiView(View):
+    """Delta-sync: посты, созданные или измененные после ``?since=``.
+
+    Курсор указывает на (updated, id) последнего полученного поста.
+    Отметка о последнем изменении хранится в кеше до следующей записи,
+    поэтому ответ «ничего нового» не делает запросов к постам. Без
+    ``since`` возвращается только текущий курсор. Удаленные посты
+    не передаются.
+    """
+    http_method_names = ['get', 'head', 'options']
+    ordering = ('updated', 'id')
+    query_budget = 2
+
+    def get_cache_namespaces(self):
+        raise NotImplementedError(
+            'Определите get_cache_namespaces() в подклассе.'
+        )
+
+    def get_queryset(self):
+        raise NotImplementedError('Определите get_queryset() в подклассе.')
+
+    def get(self, request, *args, **kwargs):
+        try:
+            queryset = self.get_queryset()
+        except Http404 as e:
+            return ApiView.error(str(e) or 'Не найдено.', 404)
+        paginator = CursorPaginator(
+            queryset.values(*SYNC_VALUES),
+            settings.SYNC_MAX_ITEMS,
+            ordering=self.ordering,
+        )
+        mark = high_water_mark(
+            self.get_cache_namespaces(),
+            lambda: self.latest_cursor(paginator),
+        )
+        since = request.GET.get('since')
+        if not since:
+            return self.response([], mark or None, has_more=False)
+        try:
+            if not mark or self.is_up_to_date(paginator, mark, since):
+                return self.response([], since, has_more=False)
+            page = paginator.page(before=since)
+        except InvalidCursor as e:
+            return ApiView.error(str(e), 400)
+        rows = list(page)
+        cursor = paginator.encode_cursor(rows[-1]) if rows else since
+        return self.response(rows, cursor, has_more=page.has_next())
+
+    @staticmethod
+    def is_up_to_date(paginator, mark, since):
+        """Курсор клиента не старше последнего изменения."""
+        try:
+            return paginator.decode_cursor(mark) <= paginator.decode_cursor(
+                since,
+            )
+        except TypeError:
+            raise InvalidCursor('Некорректный курсор.')
+
+    @staticmethod
+    def latest_cursor(paginator):
+        latest = paginator.object_list.order_by('-updated', '-id').first()
+        return paginator.encode_cursor(latest) if latest else ''
+
+    @staticmethod
+    def response(rows, cursor, has_more):
+        return JsonResponse(
+            {
+                'results': serialize_sync(rows),
+                'cursor': cursor,
+                'has_more': has_more,
+            },
+            encoder=DjangoJSONEncoder,
+            json_dumps_params=JSON_DUMPS_PARAMS,
+        )
+
+
+class PostSyncIndexApiView(PostSyncApiView):
+
+    def get_cache_namespaces(self):
+        return [index_namespace()]
+
+    def get_queryset(self):
+        return Post.objects.all()
+
+
+class PostSyncGroupApiView(PostSyncApiView):
+
+    def get_cache_namespaces(self):
+        return [group_namespace(self.kwargs['slug'])]
+
+    def get_queryset(self):
+        group_id = Group.objects.filter(
+            slug=self.kwargs['slug'],
+        ).values_list('pk', flat=True).first()
+        if group_id is None:
+            raise Http404
+        return Post.objects.filter(group_id=group_id)
+
+
+class PostSyncFollowApiView(PostSyncApiView):
+    """Delta-sync ленты подписок текущего пользователя."""
+    query_budget = 4
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return ApiView.error('Требуется авторизация.', 401)
+        return super().get(request, *args, **kwargs)
+
+    def get_cache_namespaces(self):
+        return [
+            profile_namespace(username) for _, username in self.authors
+        ]
+
+    def get_queryset(self):
+        self.authors = list(
+            Follow.objects.filter(
+                user=self.request.user,
+            ).order_by('author_id').values_list(
+                'author_id', 'author__username',
+            )
+        )
+        return Post.objects.filter(
+            author_id__in=[author_id for author_id, _ in self.authors],
+        )
@@ -0,0 +1,25 @@
+from django.contrib import admin
+
+from .models import SlowQuery
+
+
+class SlowQueryAdmin(admin.ModelAdmin):
+    """Журнал медленных запросов: только просмотр и удаление."""
+    list_display = (
+        'sql', 'count', 'total_time', 'max_time', 'view', 'location',
+        'last_seen',
+    )
+    list_filter = ('view',)
+    search_fields = ('sql', 'location', 'template')
+    date_hierarchy = 'last_seen'
+    readonly_fields = (
+        'fingerprint', 'sql', 'example', 'plan', 'view', 'location',
+        'template', 'count', 'total_time', 'max_time', 'first_seen',
+        'last_seen',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+
+admin.site.register(SlowQuery, SlowQueryAdmin)
@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from django.core.signals import request_finished
+        from django.db.backends.signals import connection_created
+
+        from .slow_queries import flush_slow_queries, install_wrapper
+        connection_created.connect(install_wrapper)
+        request_finished.connect(flush_slow_queries)
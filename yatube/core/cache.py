@@ -0,0 +1,233 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .metrics import record_cache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+)
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite (WAL), общий для всех процессов на хосте.
+
+    Замена ``LocMemCache``: воркеры gunicorn видят одни и те же ключи
+    и инвалидации. Целые числа хранятся как INTEGER, поэтому ``incr``
+    атомарен; остальные значения сериализуются pickle. При превышении
+    ``MAX_ENTRIES`` вытесняются давно не читавшиеся ключи (LRU).
+    """
+    # Как часто (в операциях записи) проверять размер кеша.
+    cull_check_interval = 64
+    # Точность отметки последнего чтения, чтобы не писать на каждый get.
+    access_resolution = 1.0
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._sets_since_cull_check = 0
+
+    def _connection(self):
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            # После fork соединение родителя использовать нельзя.
+            connection = sqlite3.connect(
+                self._path,
+                timeout=30,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = pid
+        return self._local.connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    @staticmethod
+    def _encode(value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _touch_accessed(self, keys, now):
+        with self._transaction() as connection:
+            connection.executemany(
+                'UPDATE cache SET accessed = ? '
+                'WHERE key = ? AND accessed < ?',
+                [(now, key, now - self.access_resolution) for key in keys],
+            )
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        key_map = {self._key(key, version): key for key in keys}
+        if not key_map:
+            return {}
+        now = time.time()
+        placeholders = ', '.join('?' * len(key_map))
+        rows = self._connection().execute(
+            f'SELECT key, value, accessed FROM cache '
+            f'WHERE key IN ({placeholders}) '
+            f'AND (expires IS NULL OR expires > ?)',
+            [*key_map, now],
+        ).fetchall()
+        record_cache(len(rows), len(key_map) - len(rows))
+        stale = [
+            key for key, _, accessed in rows
+            if accessed < now - self.access_resolution
+        ]
+        if stale:
+            self._touch_accessed(stale, now)
+        return {
+            key_map[key]: self._decode(value) for key, value, _ in rows
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        rows = [
+            (self._key(key, version), self._encode(value), expires, now)
+            for key, value in data.items()
+        ]
+        with self._transaction() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires, accessed)'
+                ' VALUES (?, ?, ?, ?)',
+                rows,
+            )
+        self._maybe_cull(len(rows))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        with self._transaction() as connection:
+            exists = connection.execute(
+                'SELECT 1 FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, now),
+            ).fetchone()
+            if exists:
+                return False
+            connection.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires, accessed)'
+                ' VALUES (?, ?, ?, ?)',
+                (key, self._encode(value), expires, now),
+            )
+        self._maybe_cull(1)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, now),
+            )
+        return bool(cursor.rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                'UPDATE cache SET value = value + ?, accessed = ? '
+                'WHERE key = ? AND typeof(value) = \'integer\' '
+                'AND (expires IS NULL OR expires > ?)',
+                (delta, now, key, now),
+            )
+            if not cursor.rowcount:
+                raise ValueError(f"Key '{key}' not found")
+            return connection.execute(
+                'SELECT value FROM cache WHERE key = ?', (key,),
+            ).fetchone()[0]
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        rows = [(self._key(key, version),) for key in keys]
+        with self._transaction() as connection:
+            connection.executemany('DELETE FROM cache WHERE key = ?', rows)
+
+    def clear(self):
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM cache')
+
+    def _maybe_cull(self, written):
+        self._sets_since_cull_check += written
+        if self._sets_since_cull_check < self.cull_check_interval:
+            return
+        self._sets_since_cull_check = 0
+        self._cull()
+
+    def _cull(self):
+        with self._transaction() as connection:
+            connection.execute(
+                'DELETE FROM cache WHERE expires <= ?', (time.time(),),
+            )
+            total = connection.execute(
+                'SELECT COUNT(*) FROM cache',
+            ).fetchone()[0]
+            if total <= self._max_entries:
+                return
+            excess = total - self._max_entries
+            if self._cull_frequency:
+                excess = max(excess, total // self._cull_frequency)
+            connection.execute(
+                'DELETE FROM cache WHERE key IN ('
+                ' SELECT key FROM cache ORDER BY accessed LIMIT ?'
+                ')',
+                (excess,),
+            )
@@ -0,0 +1,41 @@
+"""Кеширование страниц с «дырами» под пользовательские фрагменты.
+
+Страница рендерится один раз в виде общей для всех оболочки, в которой
+вместо фрагментов, зависящих от пользователя, стоят маркеры. При каждом
+запросе маркеры заменяются фрагментами, отрендеренными для текущего
+пользователя.
+"""
+import base64
+import json
+import re
+
+from django.template.loader import render_to_string
+
+SHELL_CONTEXT_FLAG = 'render_page_shell'
+
+_MARKER_TEMPLATE = '<!--hole:{}-->'
+_MARKER_RE = re.compile(r'<!--hole:([A-Za-z0-9_=-]+)-->')
+
+
+def make_marker(template_name, params):
+    """Возвращает маркер фрагмента для оболочки страницы."""
+    payload = json.dumps([template_name, params], sort_keys=True)
+    return _MARKER_TEMPLATE.format(
+        base64.urlsafe_b64encode(payload.encode()).decode()
+    )
+
+
+def fill_holes(content, request, context=None):
+    """Подставляет в оболочку фрагменты, отрендеренные для запроса."""
+    context = context or {}
+
+    def render_hole(match):
+        payload = base64.urlsafe_b64decode(match.group(1).encode())
+        template_name, params = json.loads(payload)
+        return render_to_string(
+            template_name,
+            {**context, **params},
+            request=request,
+        )
+
+    return _MARKER_RE.sub(render_hole, content)
@@ -0,0 +1,60 @@
+import io
+import os
+import pstats
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import profile_files
+
+SORT_KEYS = ('cumulative', 'tottime', 'calls', 'ncalls')
+
+
+class Command(BaseCommand):
+    help = 'Сводит сохраненные профили запросов в отчет о горячих точках.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--view',
+            help='Имя view, например posts:index (по умолчанию - все).',
+        )
+        parser.add_argument(
+            '--sort', default='cumulative', choices=SORT_KEYS,
+            help='Поле сортировки функций.',
+        )
+        parser.add_argument(
+            '--limit', type=int, default=30,
+            help='Сколько функций выводить для каждого view.',
+        )
+        parser.add_argument(
+            '--dir', dest='directory',
+            help='Каталог профилей (по умолчанию PROFILING_DIR).',
+        )
+        parser.add_argument(
+            '--combined', action='store_true',
+            help='Свести все view в один отчет.',
+        )
+
+    def handle(self, *args, view, sort, limit, directory, combined,
+               **options):
+        directory = directory or settings.PROFILING_DIR
+        files = profile_files(directory, view)
+        if not files:
+            raise CommandError(f'Нет профилей в {directory}.')
+        groups = defaultdict(list)
+        for path in files:
+            name = 'все view' if combined else (
+                os.path.basename(path).split('@', 1)[0]
+            )
+            groups[name].append(path)
+        for name, paths in sorted(groups.items()):
+            report = io.StringIO()
+            stats = pstats.Stats(*paths, stream=report)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{name}: файлов {len(paths)}, '
+                f'вызовов {stats.total_calls}, '
+                f'{stats.total_tt:.3f} с'
+            ))
+            stats.strip_dirs().sort_stats(sort).print_stats(limit)
+            self.stdout.write(report.getvalue())
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+
+from core.models import SlowQuery
+
+SORT_FIELDS = {
+    'total': '-total_time',
+    'max': '-max_time',
+    'count': '-count',
+    'recent': '-last_seen',
+}
+
+
+class Command(BaseCommand):
+    help = 'Выводит журнал медленных SQL-запросов с планами выполнения.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sort', default='total', choices=sorted(SORT_FIELDS),
+            help='Порядок вывода запросов.',
+        )
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Сколько запросов выводить.',
+        )
+        parser.add_argument(
+            '--view', help='Только запросы указанного view.',
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Очистить журнал после вывода.',
+        )
+
+    def handle(self, *args, sort, limit, view, clear, **options):
+        queries = SlowQuery.objects.order_by(SORT_FIELDS[sort])
+        if view:
+            queries = queries.filter(view=view)
+        if not queries.exists():
+            self.stdout.write('Медленных запросов нет.')
+        for query in queries[:limit]:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{query.count} раз, всего {query.total_time:.3f} с, '
+                f'максимум {query.max_time:.3f} с'
+                f' | {query.view or "-"} | {query.location or "-"}'
+                + (f' | {query.template}' if query.template else '')
+            ))
+            self.stdout.write(query.sql)
+            if query.plan:
+                self.stdout.write(self.style.WARNING(query.plan))
+            self.stdout.write('')
+        if clear:
+            deleted, _ = SlowQuery.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS(
+                f'Журнал очищен: {deleted} записей.'
+            ))
@@ -0,0 +1,322 @@
+"""Метрики производительности запросов в формате Prometheus.
+
+Каждый процесс копит метрики в памяти и раз в ``METRICS_FLUSH_INTERVAL``
+секунд сбрасывает их в свой файл в ``METRICS_DIR``. Endpoint ``/metrics/``
+складывает файлы всех процессов, поэтому метрики общие для воркеров
+и не пропадают при их перезапуске: файлы завершившихся процессов
+переносятся в файл процесса, который собирает метрики, и удаляются.
+"""
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+# Границы корзин гистограммы времени ответа, в секундах.
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+UNRESOLVED_VIEW = '<unresolved>'
+# Поля RequestMetrics, которые суммируются по view.
+REQUEST_FIELDS = (
+    'db_queries', 'db_seconds', 'template_seconds', 'cache_hits',
+    'cache_misses',
+)
+# Счетчики view: поле агрегата, имя метрики и описание.
+COUNTERS = (
+    ('db_queries', 'yatube_db_queries_total', 'SQL-запросы.'),
+    ('db_seconds', 'yatube_db_query_seconds_total',
+     'Время выполнения SQL-запросов.'),
+    ('template_seconds', 'yatube_template_render_seconds_total',
+     'Время рендеринга шаблонов.'),
+    ('cache_hits', 'yatube_cache_hits_total', 'Попадания в кеш.'),
+    ('cache_misses', 'yatube_cache_misses_total', 'Промахи кеша.'),
+    ('response_bytes', 'yatube_response_bytes_total',
+     'Размер ответов (без потоковых).'),
+)
+
+_local = threading.local()
+
+
+class RequestMetrics:
+    """Метрики одного запроса, которые собирают хуки БД, кеша и шаблонов."""
+    __slots__ = (*REQUEST_FIELDS, 'render_depth', 'request')
+
+    def __init__(self, request):
+        self.request = request
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.render_depth = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_seconds += time.perf_counter() - started
+
+
+def current_request():
+    return getattr(_local, 'request', None)
+
+
+def record_cache(hits, misses):
+    """Учитывает обращение к кешу в метриках текущего запроса."""
+    metrics = current_request()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+def _empty_view_stats():
+    return {
+        'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+        'count': 0,
+        'seconds': 0.0,
+        **{name: 0 for name, _, _ in COUNTERS},
+    }
+
+
+def _merge_views(total, views):
+    """Прибавляет агрегаты ``views`` к ``total``."""
+    for view, stats in views.items():
+        merged = total.setdefault(view, _empty_view_stats())
+        merged['buckets'] = [
+            a + b for a, b in zip(merged['buckets'], stats['buckets'])
+        ]
+        for key, value in stats.items():
+            if key != 'buckets':
+                merged[key] += value
+
+
+def _metrics_files():
+    return glob.glob(os.path.join(settings.METRICS_DIR, 'metrics-*.json'))
+
+
+def _is_dead(path):
+    """Файл процесса, которого уже нет."""
+    try:
+        pid = int(os.path.basename(path).split('-')[1])
+    except (IndexError, ValueError):
+        return False
+    if pid == os.getpid():
+        # Файл процесса с тем же pid, запущенного раньше.
+        return path != registry.path
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        # Процесс есть, но принадлежит другому пользователю.
+        return False
+    return False
+
+
+class Registry:
+    """Агрегаты метрик процесса по view."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.started = int(time.time() * 1000)
+        self.views = {}
+        # Агрегаты завершившихся процессов, перенесенные из их файлов.
+        self.retired = {}
+        self.flushed_at = time.monotonic()
+
+    def _check_fork(self):
+        # Агрегаты родителя, скопированные при fork, уже в его файле.
+        if self.pid != os.getpid():
+            self._reset()
+
+    @property
+    def path(self):
+        # Время старта в имени файла: pid может достаться новому процессу.
+        return os.path.join(
+            settings.METRICS_DIR, f'metrics-{self.pid}-{self.started}.json',
+        )
+
+    def observe(self, view, seconds, request_metrics, response_bytes):
+        with self._lock:
+            self._check_fork()
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = _empty_view_stats()
+            stats['buckets'][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            stats['count'] += 1
+            stats['seconds'] += seconds
+            for name in REQUEST_FIELDS:
+                stats[name] += getattr(request_metrics, name)
+            stats['response_bytes'] += response_bytes
+            due = (
+                time.monotonic() - self.flushed_at
+                >= settings.METRICS_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Записывает агрегаты процесса в его файл."""
+        with self._lock:
+            self._check_fork()
+            views = {}
+            _merge_views(views, self.retired)
+            _merge_views(views, self.views)
+            payload = json.dumps(views)
+            path = self.path
+            self.flushed_at = time.monotonic()
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as file:
+            file.write(payload)
+        os.replace(temporary, path)
+
+    def retire_dead(self):
+        """Переносит метрики завершившихся процессов в свой файл.
+
+        Файл сначала переименовывается: это удается только одному из
+        процессов, которые собирают метрики одновременно, поэтому
+        метрики не удваиваются.
+        """
+        for path in filter(_is_dead, _metrics_files()):
+            claimed = f'{path}.{os.getpid()}.retired'
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            try:
+                with open(claimed) as file:
+                    views = json.load(file)
+            except (OSError, ValueError):
+                views = {}
+            with self._lock:
+                self._check_fork()
+                _merge_views(self.retired, views)
+            os.remove(claimed)
+
+
+registry = Registry()
+
+
+def collect():
+    """Суммирует метрики всех процессов, включая текущий."""
+    registry.retire_dead()
+    registry.flush()
+    total = {}
+    for path in _metrics_files():
+        try:
+            with open(path) as file:
+                views = json.load(file)
+        except (OSError, ValueError):
+            continue
+        _merge_views(total, views)
+    return total
+
+
+def _label(view):
+    value = view.replace('\\', '\\\\').replace('"', '\\"')
+    return f'view="{value}"'
+
+
+def render_prometheus(views):
+    """Текстовый формат Prometheus (exposition format 0.0.4)."""
+    name = 'yatube_request_duration_seconds'
+    lines = [
+        f'# HELP {name} Время обработки запроса.',
+        f'# TYPE {name} histogram',
+    ]
+    for view, stats in sorted(views.items()):
+        label = _label(view)
+        cumulative = 0
+        bounds = [*(repr(bound) for bound in LATENCY_BUCKETS), '+Inf']
+        for bound, count in zip(bounds, stats['buckets']):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{label}}} {stats["seconds"]!r}')
+        lines.append(f'{name}_count{{{label}}} {stats["count"]}')
+    for key, metric, help_text in COUNTERS:
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} counter')
+        for view, stats in sorted(views.items()):
+            lines.append(f'{metric}{{{_label(view)}}} {stats[key]!r}')
+    return '\n'.join(lines) + '\n'
+
+
+class TimedTemplate(Template):
+    """Шаблон, время рендеринга которого учитывается в метриках запроса."""
+
+    def render(self, context=None, request=None):
+        metrics = current_request()
+        if metrics is None:
+            return super().render(context, request)
+        # Вложенный render_to_string уже учтен во внешнем рендеринге.
+        metrics.render_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.render_depth -= 1
+            if not metrics.render_depth:
+                metrics.template_seconds += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django, который замеряет время рендеринга.
+
+    Подключается в ``TEMPLATES`` вместо ``DjangoTemplates``, поэтому
+    сам класс шаблонов Django не подменяется.
+    """
+
+    def from_string(self, template_code):
+        template = super().from_string(template_code)
+        return TimedTemplate(template.template, self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+class MetricsMiddleware:
+    """Собирает по каждому view время ответа, SQL-запросы, время
+    рендеринга шаблонов, обращения к кешу и размер ответа.
+
+    Должен стоять первым в ``MIDDLEWARE``, чтобы замерять весь запрос.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = _local.request = RequestMetrics(request)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.execute_wrapper)
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.request = None
+        seconds = time.perf_counter() - started
+        match = request.resolver_match
+        registry.observe(
+            match.view_name if match is not None else UNRESOLVED_VIEW,
+            seconds,
+            metrics,
+            0 if response.streaming else len(response.content),
+        )
+        return response
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40, unique=True, verbose_name='Отпечаток')),
+                ('sql', models.TextField(verbose_name='Нормализованный SQL')),
+                ('example', models.TextField(verbose_name='Пример запроса')),
+                ('plan', models.TextField(blank=True, verbose_name='План запроса')),
+                ('view', models.CharField(blank=True, max_length=200, verbose_name='View')),
+                ('location', models.CharField(blank=True, max_length=500, verbose_name='Место в коде')),
+                ('template', models.CharField(blank=True, max_length=200, verbose_name='Шаблон')),
+                ('count', models.PositiveIntegerField(default=1, verbose_name='Количество')),
+                ('total_time', models.FloatField(verbose_name='Суммарное время, с')),
+                ('max_time', models.FloatField(verbose_name='Максимальное время, с')),
+                ('first_seen', models.DateTimeField(auto_now_add=True, verbose_name='Впервые')),
+                ('last_seen', models.DateTimeField(verbose_name='Последний раз')),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'ordering': ('-total_time',),
+            },
+        ),
+    ]
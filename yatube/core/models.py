@@ -0,0 +1,44 @@
+from django.db import models
+
+
+class SlowQuery(models.Model):
+    """Медленный SQL-запрос, сгруппированный по отпечатку."""
+
+    fingerprint = models.CharField(
+        max_length=40,
+        unique=True,
+        verbose_name='Отпечаток',
+    )
+    sql = models.TextField(verbose_name='Нормализованный SQL')
+    example = models.TextField(verbose_name='Пример запроса')
+    plan = models.TextField(blank=True, verbose_name='План запроса')
+    view = models.CharField(max_length=200, blank=True, verbose_name='View')
+    location = models.CharField(
+        max_length=500,
+        blank=True,
+        verbose_name='Место в коде',
+    )
+    template = models.CharField(
+        max_length=200,
+        blank=True,
+        verbose_name='Шаблон',
+    )
+    count = models.PositiveIntegerField(
+        default=1,
+        verbose_name='Количество',
+    )
+    total_time = models.FloatField(verbose_name='Суммарное время, с')
+    max_time = models.FloatField(verbose_name='Максимальное время, с')
+    first_seen = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Впервые',
+    )
+    last_seen = models.DateTimeField(verbose_name='Последний раз')
+
+    class Meta:
+        ordering = ('-total_time',)
+        verbose_name = 'Медленный запрос'
+        verbose_name_plural = 'Медленные запросы'
+
+    def __str__(self):
+        return self.sql[:100]
@@ -0,0 +1,140 @@
+"""Выборочное профилирование запросов в production.
+
+Профилируется доля ``PROFILING_SAMPLE_RATE`` запросов, запросы к путям
+из ``PROFILING_PATHS`` и запросы с заголовком ``X-Profile``, равным
+``PROFILING_HEADER_TOKEN``. Профили копятся в памяти процесса по view
+и раз в ``PROFILING_FLUSH_INTERVAL`` секунд сохраняются в
+``PROFILING_DIR``, где остается не больше ``PROFILING_MAX_FILES``
+последних файлов. Свести их в отчет можно командой ``profile_report``.
+"""
+import cProfile
+import glob
+import hmac
+import os
+import pstats
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import UNRESOLVED_VIEW
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_SUFFIX = '.prof'
+
+
+def view_slug(view):
+    """Имя view для имени файла: ``posts:index`` -> ``posts.index``."""
+    return re.sub(r'[^\w.-]', '_', view.replace(':', '.'))
+
+
+def profile_files(directory, view=None):
+    """Файлы профилей в каталоге, от старых к новым."""
+    prefix = f'{view_slug(view)}@' if view else ''
+    pattern = os.path.join(directory, f'{prefix}*{PROFILE_SUFFIX}')
+    return sorted(glob.glob(pattern), key=os.path.getmtime)
+
+
+class ProfileAggregator:
+    """Сводные профили процесса по view."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.stats = {}
+        self.flushed_at = time.monotonic()
+
+    def add(self, view, profile):
+        with self._lock:
+            if self.pid != os.getpid():
+                # Профили родителя, скопированные при fork.
+                self._reset()
+            stats = self.stats.get(view)
+            if stats is None:
+                self.stats[view] = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+            due = (
+                time.monotonic() - self.flushed_at
+                >= settings.PROFILING_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Сохраняет накопленные профили и удаляет самые старые файлы."""
+        with self._lock:
+            stats, self.stats = self.stats, {}
+            self.flushed_at = time.monotonic()
+        if not stats:
+            return
+        directory = settings.PROFILING_DIR
+        os.makedirs(directory, exist_ok=True)
+        stamp = int(time.time() * 1000)
+        for view, view_stats in stats.items():
+            view_stats.dump_stats(os.path.join(
+                directory,
+                f'{view_slug(view)}@{self.pid}@{stamp}{PROFILE_SUFFIX}',
+            ))
+        for path in profile_files(directory)[:-settings.PROFILING_MAX_FILES]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+aggregator = ProfileAggregator()
+
+
+class ProfilingMiddleware:
+    """Профилирует выбранные запросы с помощью ``cProfile``.
+
+    Если ни одно условие выборки не настроено, middleware отключается
+    при старте, а в остальное время на непрофилируемый запрос тратится
+    только проверка условий.
+    """
+
+    def __init__(self, get_response):
+        if not (
+            settings.PROFILING_SAMPLE_RATE
+            or settings.PROFILING_PATHS
+            or settings.PROFILING_HEADER_TOKEN
+        ):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def should_profile(self, request):
+        if random.random() < settings.PROFILING_SAMPLE_RATE:
+            return True
+        if request.path.startswith(tuple(settings.PROFILING_PATHS)):
+            return True
+        token = settings.PROFILING_HEADER_TOKEN
+        return bool(token) and hmac.compare_digest(
+            request.META.get(PROFILE_HEADER, ''), token,
+        )
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # В этом потоке уже работает другой профилировщик.
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.disable()
+        match = request.resolver_match
+        aggregator.add(
+            match.view_name if match is not None else UNRESOLVED_VIEW,
+            profile,
+        )
+        return response
@@ -0,0 +1,191 @@
+"""Журнал медленных SQL-запросов.
+
+Обертка ``execute`` каждого соединения замеряет время запросов. Запросы
+дольше ``SLOW_QUERY_THRESHOLD`` секунд группируются по отпечатку
+нормализованного SQL и сохраняются в ``SlowQuery`` вместе с планом
+самого долгого выполнения и местом в коде, откуда он выполнен.
+Медленные запросы HTTP-запроса сохраняются после отправки ответа.
+"""
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import metrics
+from .models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+_TEMPLATE_FILE = os.path.join('django', 'template', 'base.py')
+_OWN_FILES = {__file__, metrics.__file__}
+
+_local = threading.local()
+
+
+def normalize_sql(sql):
+    """SQL без значений: литералы и параметры заменены на ``?``,
+    списки ``IN (?, ?, ...)`` свернуты."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST_RE.sub('(...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize_sql(sql).encode()).hexdigest()
+
+
+def find_location():
+    """Ближайшая к запросу строка кода проекта и рендерящийся шаблон."""
+    base = os.path.join(settings.BASE_DIR, '')
+    location = template = ''
+    frame = sys._getframe(1)
+    while frame is not None and not (location and template):
+        code = frame.f_code
+        filename = code.co_filename
+        if (
+            not location
+            and filename.startswith(base)
+            and filename not in _OWN_FILES
+        ):
+            location = (
+                f'{os.path.relpath(filename, base)}:{frame.f_lineno} '
+                f'in {code.co_name}'
+            )
+        if not template and filename.endswith(_TEMPLATE_FILE):
+            origin = getattr(frame.f_locals.get('self'), 'origin', None)
+            if origin is not None:
+                template = origin.template_name or origin.name
+        frame = frame.f_back
+    return location, str(template)
+
+
+def explain(connection, sql, params):
+    """План запроса: ``EXPLAIN QUERY PLAN`` в SQLite, ``EXPLAIN`` в других
+    базах."""
+    if connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        prefix = 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+
+def record_slow_query(connection, sql, params, many, seconds,
+                      location='', template='', view=''):
+    """Сохраняет запрос в журнал; план обновляется, когда запрос
+    выполнился дольше прежнего максимума."""
+    now = timezone.now()
+    key = fingerprint(sql)
+    max_time = SlowQuery.objects.filter(
+        fingerprint=key,
+    ).values_list('max_time', flat=True).first()
+    if max_time is not None and seconds <= max_time:
+        SlowQuery.objects.filter(fingerprint=key).update(
+            count=F('count') + 1,
+            total_time=F('total_time') + seconds,
+            last_seen=now,
+        )
+        return
+    slowest = {
+        'example': f'{sql}\n-- params: {params!r}'[:10000],
+        'plan': '',
+        'location': location[:500],
+        'template': template[:200],
+    }
+    if not many and sql.lstrip().upper().startswith('SELECT'):
+        slowest['plan'] = explain(connection, sql, params)
+    if max_time is not None:
+        SlowQuery.objects.filter(fingerprint=key).update(
+            count=F('count') + 1,
+            total_time=F('total_time') + seconds,
+            max_time=Greatest('max_time', Value(seconds)),
+            last_seen=now,
+            **slowest,
+        )
+        return
+    SlowQuery.objects.get_or_create(
+        fingerprint=key,
+        defaults={
+            'sql': normalize_sql(sql),
+            'view': view,
+            'total_time': seconds,
+            'max_time': seconds,
+            'last_seen': now,
+            **slowest,
+        },
+    )
+
+
+def flush_slow_queries(**kwargs):
+    """Сохраняет накопленные медленные запросы (сигнал request_finished).
+
+    Во время запроса журнал не пишется через его соединение: запись
+    заняла бы блокировку SQLite на GET и пропала бы при откате
+    транзакции view.
+    """
+    pending = getattr(_local, 'pending', None)
+    if not pending:
+        return
+    _local.pending = []
+    # Запросы самого журнала через обертку не учитываются.
+    _local.recording = True
+    try:
+        for alias, args in pending:
+            try:
+                with transaction.atomic(using=alias):
+                    record_slow_query(connections[alias], *args)
+            except DatabaseError:
+                logger.exception('Не удалось сохранить медленный запрос')
+    finally:
+        _local.recording = False
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    seconds = time.perf_counter() - started
+    threshold = settings.SLOW_QUERY_THRESHOLD
+    if (
+        threshold is None
+        or seconds < threshold
+        or getattr(_local, 'recording', False)
+    ):
+        return result
+    location, template = find_location()
+    request_metrics = metrics.current_request()
+    match = None
+    if request_metrics is not None:
+        match = request_metrics.request.resolver_match
+    if not hasattr(_local, 'pending'):
+        _local.pending = []
+    _local.pending.append((
+        context['connection'].alias,
+        (sql, params, many, seconds, location, template,
+         match.view_name if match is not None else ''),
+    ))
+    # Вне запроса (команды, shell) сохраняем сразу.
+    if request_metrics is None:
+        flush_slow_queries()
+    return result
+
+
+def install_wrapper(sender, connection, **kwargs):
+    """Подключает журнал к новому соединению (сигнал connection_created)."""
+    if slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, slow_query_wrapper)
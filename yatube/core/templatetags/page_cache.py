@@ -0,0 +1,20 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..holes import SHELL_CONTEXT_FLAG, make_marker
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, template_name, **params):
+    """Фрагмент, который рендерится отдельно для каждого пользователя.
+
+    При рендере кешируемой оболочки выводит маркер, иначе рендерит
+    шаблон на месте, как ``{% include %}``.
+    """
+    if context.get(SHELL_CONTEXT_FLAG):
+        return mark_safe(make_marker(template_name, params))
+    fragment = context.template.engine.get_template(template_name)
+    with context.push(**params):
+        return fragment.render(context)
@@ -0,0 +1,72 @@
+"""Помощники для тестов."""
+import os
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+SQLITE_CACHE_BACKEND = 'core.cache.SQLiteCache'
+
+
+@contextmanager
+def execute_on_commit(using=DEFAULT_DB_ALIAS):
+    """Выполняет при выходе ``on_commit``-колбэки, поставленные в блоке.
+
+    ``TestCase`` не коммитит транзакцию, поэтому такие колбэки в тестах
+    сами не запускаются (аналог ``captureOnCommitCallbacks`` из
+    Django 3.2).
+    """
+    connection = connections[using]
+    start = len(connection.run_on_commit)
+    try:
+        yield
+    finally:
+        # Колбэки могут ставить новые колбэки.
+        while len(connection.run_on_commit) > start:
+            pending = connection.run_on_commit[start:]
+            del connection.run_on_commit[start:]
+            for _, callback in pending:
+                callback()
+
+
+@contextmanager
+def isolated_cache():
+    """Переносит файлы кешей ``SQLiteCache`` во временный каталог.
+
+    Иначе ``cache.clear()`` в тестах стирал бы рабочий кеш сайта.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        caches = {}
+        for alias, config in settings.CACHES.items():
+            config = dict(config)
+            if config['BACKEND'] == SQLITE_CACHE_BACKEND:
+                config['LOCATION'] = os.path.join(
+                    directory, f'{alias}.sqlite3',
+                )
+            caches[alias] = config
+        with override_settings(CACHES=caches):
+            yield
+
+
+@contextmanager
+def isolated_environment():
+    """Кеш во временном файле и миниатюры без пула процессов (они
+    создаются сразу). Общая настройка для manage.py test и pytest."""
+    with isolated_cache(), override_settings(THUMBNAIL_WORKERS=0):
+        yield
+
+
+class IsolatedCacheRunner(DiscoverRunner):
+    """Запускает тесты в ``isolated_environment()``."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_stack = ExitStack()
+        self._cache_stack.enter_context(isolated_environment())
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_stack.close()
+        super().teardown_test_environment(**kwargs)
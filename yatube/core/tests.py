@@ -1,6 +1,38 @@
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
 from http import HTTPStatus
+from io import StringIO
 
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.signals import request_finished
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import SQLiteCache
+from posts.models import Post
+
+from .metrics import LATENCY_BUCKETS, _empty_view_stats, registry
+from .models import SlowQuery
+from .profiling import aggregator, profile_files
+from .slow_queries import (
+    fingerprint, flush_slow_queries, normalize_sql, record_slow_query,
+)
+
+User = get_user_model()
+
+TEMP_METRICS_DIR = tempfile.mkdtemp()
+TEMP_PROFILING_DIR = tempfile.mkdtemp()
 
 
 class ViewTestClass(TestCase):
@@ -10,4 +42,350 @@ class ViewTestClass(TestCase):
 
     def test_404_use_correct_template(self):
         response = self.client.get('/nonexist-page/')
-        self.assertTemplateUsed(response, 'core/404.html')
\ No newline at end of file
+        self.assertTemplateUsed(response, 'core/404.html')
+
+
+def _increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    """Тестирование общего для процессов кеша SQLiteCache."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_tests_use_temporary_file(self):
+        """Тесты не стирают рабочий кеш сайта."""
+        self.assertNotEqual(
+            caches['default']._path,
+            os.path.join(settings.BASE_DIR, 'cache.sqlite3'),
+        )
+
+    def test_set_get_delete(self):
+        self.cache.set('key', {'value': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'value': [1, 2]})
+        self.assertEqual(
+            self.cache.get_many(['key', 'missing']),
+            {'key': {'value': [1, 2]}},
+        )
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_timeout(self):
+        self.cache.set('key', 'value', timeout=0.05)
+        self.assertTrue(self.cache.has_key('key'))
+        time.sleep(0.1)
+        self.assertFalse(self.cache.has_key('key'))
+        self.assertTrue(self.cache.add('key', 'other'))
+        self.assertFalse(self.cache.add('key', 'third'))
+        self.assertEqual(self.cache.get('key'), 'other')
+
+    def test_shared_between_instances(self):
+        SQLiteCache(self.location, {}).set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        processes = [
+            multiprocessing.Process(
+                target=_increment, args=(self.location, 50),
+            )
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_lru_eviction(self):
+        cache = SQLiteCache(self.location, {'OPTIONS': {'MAX_ENTRIES': 3}})
+        cache.cull_check_interval = 1
+        cache.access_resolution = 0
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        cache.get('a')
+        cache.set('d', 'd')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 'a')
+        self.assertEqual(cache.get('d'), 'd')
+
+
+@override_settings(METRICS_DIR=TEMP_METRICS_DIR)
+class MetricsTests(TestCase):
+    """Тестирование метрик запросов и endpoint /metrics/."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_METRICS_DIR, ignore_errors=True)
+
+    def _metrics(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return response.content.decode()
+
+    def _value(self, content, metric, view):
+        match = re.search(
+            rf'^{metric}{{view="{re.escape(view)}"}} (\S+)$',
+            content,
+            re.MULTILINE,
+        )
+        self.assertIsNotNone(match, f'{metric} для {view} нет в выводе')
+        return float(match.group(1))
+
+    def test_view_metrics(self):
+        cache.clear()
+        before = self._metrics()
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        content = self._metrics()
+        count = self._value(
+            content, 'yatube_request_duration_seconds_count', 'posts:index',
+        )
+        previous = 0
+        if 'view="posts:index"' in before:
+            previous = self._value(
+                before, 'yatube_request_duration_seconds_count',
+                'posts:index',
+            )
+        self.assertEqual(count - previous, 2)
+        for metric in (
+            'yatube_db_queries_total',
+            'yatube_template_render_seconds_total',
+            'yatube_cache_hits_total',
+            'yatube_cache_misses_total',
+            'yatube_response_bytes_total',
+        ):
+            with self.subTest(metric=metric):
+                self.assertGreater(
+                    self._value(content, metric, 'posts:index'), 0,
+                )
+
+    def test_metrics_are_merged_across_processes(self):
+        stats = _empty_view_stats()
+        stats['buckets'][0] = 2
+        stats['buckets'][-1] = 1
+        stats['count'] = 3
+        stats['db_queries'] = 7
+        for pid in (1, 2):
+            path = os.path.join(TEMP_METRICS_DIR, f'metrics-{pid}-0.json')
+            with open(path, 'w') as file:
+                json.dump({'test:view': stats}, file)
+        content = self._metrics()
+        self.assertEqual(
+            self._value(
+                content, 'yatube_request_duration_seconds_count', 'test:view',
+            ),
+            6,
+        )
+        self.assertEqual(
+            self._value(content, 'yatube_db_queries_total', 'test:view'), 14,
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            f'{{view="test:view",le="{LATENCY_BUCKETS[0]!r}"}} 4',
+            content,
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="test:view",le="+Inf"} 6',
+            content,
+        )
+
+    def test_dead_process_files_are_retired(self):
+        """Файл завершившегося процесса удаляется, а его метрики
+        остаются в файле процесса, который их собрал."""
+        stats = _empty_view_stats()
+        stats['count'] = 5
+        # pid больше максимально возможного в Linux: такого процесса нет.
+        dead = os.path.join(TEMP_METRICS_DIR, f'metrics-{2 ** 22 + 1}-0.json')
+        with open(dead, 'w') as file:
+            json.dump({'test:dead': stats}, file)
+        retired = registry.retired
+        registry.retired = {}
+        try:
+            for _ in range(2):
+                content = self._metrics()
+                self.assertFalse(os.path.exists(dead))
+                self.assertEqual(
+                    self._value(
+                        content, 'yatube_request_duration_seconds_count',
+                        'test:dead',
+                    ),
+                    5,
+                )
+            with open(registry.path) as file:
+                self.assertEqual(json.load(file)['test:dead']['count'], 5)
+        finally:
+            registry.retired = retired
+            registry.flush()
+
+    def test_metrics_only_for_allowed_ips(self):
+        response = self.client.get(
+            reverse('metrics'), REMOTE_ADDR='10.0.0.1',
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+
+@override_settings(
+    PROFILING_DIR=TEMP_PROFILING_DIR,
+    PROFILING_HEADER_TOKEN='secret',
+    PROFILING_PATHS=['/about/'],
+    PROFILING_MAX_FILES=3,
+    PROFILING_FLUSH_INTERVAL=0,
+)
+class ProfilingTests(TestCase):
+    """Тестирование выборочного профилирования запросов."""
+
+    def setUp(self):
+        shutil.rmtree(TEMP_PROFILING_DIR, ignore_errors=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_PROFILING_DIR, ignore_errors=True)
+
+    def test_only_selected_requests_are_profiled(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'), HTTP_X_PROFILE='wrong')
+        self.assertEqual(profile_files(TEMP_PROFILING_DIR), [])
+        self.client.get(reverse('posts:index'), HTTP_X_PROFILE='secret')
+        self.client.get(reverse('about:author'))
+        self.assertEqual(
+            len(profile_files(TEMP_PROFILING_DIR, 'posts:index')), 1,
+        )
+        self.assertEqual(
+            len(profile_files(TEMP_PROFILING_DIR, 'about:author')), 1,
+        )
+
+    def test_directory_is_rotated(self):
+        for _ in range(5):
+            self.client.get(reverse('posts:index'), HTTP_X_PROFILE='secret')
+            time.sleep(0.01)
+        self.assertEqual(len(profile_files(TEMP_PROFILING_DIR)), 3)
+
+    def test_profile_report(self):
+        with override_settings(PROFILING_FLUSH_INTERVAL=60):
+            client = Client()
+            for _ in range(3):
+                client.get(reverse('posts:index'), HTTP_X_PROFILE='secret')
+            aggregator.flush()
+        files = profile_files(TEMP_PROFILING_DIR)
+        self.assertEqual(len(files), 1)
+        out = StringIO()
+        call_command('profile_report', view='posts:index', limit=5, stdout=out)
+        self.assertIn('posts.index: файлов 1', out.getvalue())
+        self.assertIn('get_response', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('profile_report', view='unknown', stdout=StringIO())
+
+    @override_settings(PROFILING_HEADER_TOKEN='', PROFILING_PATHS=[])
+    def test_disabled_without_triggers(self):
+        self.client.get(reverse('posts:index'))
+        aggregator.flush()
+        self.assertEqual(profile_files(TEMP_PROFILING_DIR), [])
+
+
+class SlowQueryTests(TestCase):
+    """Тестирование журнала медленных запросов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        Post.objects.create(text='TestText', author=cls.user)
+
+    def test_fingerprint_ignores_values(self):
+        self.assertEqual(
+            normalize_sql(
+                "SELECT * FROM t WHERE  a = 'x' AND b IN (%s, %s, %s)"
+            ),
+            'SELECT * FROM t WHERE a = ? AND b IN (...)',
+        )
+        self.assertEqual(
+            fingerprint('SELECT * FROM t1 WHERE id = 1 LIMIT 21'),
+            fingerprint('SELECT * FROM t1 WHERE id = 25 LIMIT 10'),
+        )
+
+    def test_slow_queries_are_recorded(self):
+        url = reverse(
+            'posts:profile', kwargs={'username': self.user.get_username()},
+        )
+        with override_settings(SLOW_QUERY_THRESHOLD=0):
+            cache.clear()
+            self.client.get(url)
+            cache.clear()
+            self.client.get(url)
+        query = SlowQuery.objects.get(
+            view='posts:profile',
+            sql__contains='FROM "posts_post"',
+            sql__startswith='SELECT "posts_post"',
+        )
+        self.assertEqual(query.count, 2)
+        self.assertIn('posts_post', query.plan)
+        self.assertTrue(query.location)
+        self.assertIn('"posts_post"."author_id" = ?', query.sql)
+        self.assertGreaterEqual(query.max_time, 0)
+
+    def test_recorded_after_response(self):
+        """Во время запроса журнал не пишется через его соединение."""
+        url = reverse(
+            'posts:profile', kwargs={'username': self.user.get_username()},
+        )
+        request_finished.disconnect(flush_slow_queries)
+        try:
+            with override_settings(SLOW_QUERY_THRESHOLD=0):
+                cache.clear()
+                self.client.get(url)
+            self.assertFalse(SlowQuery.objects.exists())
+        finally:
+            request_finished.connect(flush_slow_queries)
+        flush_slow_queries()
+        self.assertTrue(SlowQuery.objects.filter(view='posts:profile'))
+
+    def test_plan_refreshed_when_slower(self):
+        sql = 'SELECT "posts_post"."id" FROM "posts_post"'
+        key = fingerprint(sql)
+        SlowQuery.objects.create(
+            fingerprint=key, sql=normalize_sql(sql), plan='old',
+            total_time=1, max_time=1, last_seen=timezone.now(),
+        )
+        record_slow_query(connection, sql, (), False, 0.5)
+        query = SlowQuery.objects.get(fingerprint=key)
+        self.assertEqual((query.count, query.plan), (2, 'old'))
+        record_slow_query(connection, sql, (), False, 2)
+        query.refresh_from_db()
+        self.assertEqual(query.max_time, 2)
+        self.assertIn('posts_post', query.plan)
+
+    def test_fast_queries_are_not_recorded(self):
+        self.client.get(reverse('posts:index'))
+        self.assertFalse(SlowQuery.objects.exists())
+
+    def test_command_and_admin(self):
+        with override_settings(SLOW_QUERY_THRESHOLD=0):
+            Post.objects.filter(author=self.user).count()
+        out = StringIO()
+        call_command('slow_queries', limit=50, stdout=out)
+        self.assertIn('COUNT(*)', out.getvalue())
+        admin = User.objects.create_superuser(
+            username='TestAdmin', email='admin@example.com', password='pass',
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:core_slowquery_changelist'),
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        call_command('slow_queries', clear=True, stdout=StringIO())
+        self.assertFalse(SlowQuery.objects.exists())
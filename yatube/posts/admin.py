@@ -1,16 +1,79 @@
+from django import forms
 from django.contrib import admin
+from django.forms.models import ModelChoiceIterator
 
-from .models import Post, Group
+from .models import Post, Group, Comment
+from .paginators import EstimatedCountPaginator
+from .search import search_posts
+
+
+class PrefetchedChoiceIterator(ModelChoiceIterator):
+    """Варианты поля из списка ``field.prefetched_choices``.
+
+    Поле копируется для каждой строки ``list_editable``, а ссылка на
+    список при копировании сохраняется, поэтому варианты выбираются из
+    БД один раз на страницу, а не в каждой строке.
+    """
+
+    def __iter__(self):
+        return iter(self.field.prefetched_choices)
+
+    def __len__(self):
+        return len(self.field.prefetched_choices)
 
 
 class PostAdmin(admin.ModelAdmin):
     """Свойства для администрирования постов."""
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
+    autocomplete_fields = ('author', 'group')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+    def get_changelist_formset(self, request, **kwargs):
+        """Группы для ``list_editable`` выбираются один раз на страницу,
+        а не отдельным запросом в каждой строке."""
+        formset = super().get_changelist_formset(request, **kwargs)
+        group = formset.form.base_fields['group']
+        # ``iter()``: иначе ``list()`` спросит ``len()`` и сделает COUNT(*).
+        group.prefetched_choices = list(iter(group.choices))
+        group.iterator = PrefetchedChoiceIterator
+        # Виджет autocomplete запрашивал бы выбранную группу в каждой
+        # строке, а обычному списку хватает готовых вариантов.
+        group.widget = forms.Select(choices=group.choices)
+        return formset
+
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по полнотекстовому индексу вместо ``icontains``."""
+        if not search_term:
+            return queryset, False
+        return search_posts(queryset, search_term), False
+
+
+class GroupAdmin(admin.ModelAdmin):
+    """Свойства для администрирования сообществ."""
+    list_display = ('pk', 'title', 'slug', 'posts_count')
+    search_fields = ('title', 'slug')
+    prepopulated_fields = {'slug': ('title',)}
+
+
+class CommentAdmin(admin.ModelAdmin):
+    """Свойства для администрирования комментариев."""
+    list_display = ('pk', 'text', 'created', 'author', 'post')
+    list_select_related = ('author', 'post')
+    date_hierarchy = 'created'
+    autocomplete_fields = ('author',)
+    raw_id_fields = ('post',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
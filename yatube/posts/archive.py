@@ -0,0 +1,309 @@
+"""Массовая загрузка записей архива (команды import_archive и loadbench)."""
+from collections import Counter
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .counters import recount_groups, recount_posts, recount_users
+from .feed import rebuild_feeds, recount_feed_unread
+from .models import Comment, Follow, Group, Post, User
+from .search import rebuild_search_index
+
+# Порядок сохранения: записи ссылаются на уже сохраненные.
+RECORD_TYPES = ('user', 'group', 'post', 'comment', 'follow')
+
+# Обязательные поля записей каждого типа.
+REQUIRED_FIELDS = {
+    'user': ('username',),
+    'group': ('slug', 'title'),
+    'post': ('author', 'text'),
+    'comment': ('post', 'author', 'text'),
+    'follow': ('user', 'author'),
+}
+
+
+class ArchiveError(Exception):
+    pass
+
+
+@contextmanager
+def explicit_dates():
+    """Дает сохранить даты из архива в полях с ``auto_now_add``."""
+    fields = [
+        Post._meta.get_field('pub_date'),
+        Comment._meta.get_field('created'),
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def rebuild_denormalized():
+    """Обновляет данные, которые обычно поддерживают сигналы."""
+    with transaction.atomic():
+        recount_groups()
+        recount_posts()
+        recount_users()
+        rebuild_feeds()
+        recount_feed_unread()
+        rebuild_search_index()
+    # Версии кеша страниц начнутся заново с текущего времени.
+    cache.clear()
+
+
+class Importer:
+    """Сохраняет записи архива пачками через ``bulk_create``.
+
+    Авторы и группы ищутся по словарям username/slug -> id, которые
+    дополняются одним запросом на пачку. Посты и комментарии сохраняют
+    id из архива. Уже импортированные записи (тот же id и содержимое)
+    пропускаются, поэтому повторный импорт пачки ничего не дублирует,
+    а id, занятый другой записью, - ошибка: иначе пост молча пропал бы,
+    а его комментарии достались бы чужому посту. Существующие
+    пользователи и группы используются как есть; все пропущенные записи
+    считаются в ``skipped``.
+
+    Поля записи проверяются и приводятся к типам уже в ``add``, чтобы
+    ошибка указывала на строку архива, а не на всю пачку.
+    """
+
+    def __init__(self):
+        self.users = {}
+        self.groups = {}
+        self.buffers = {record_type: [] for record_type in RECORD_TYPES}
+        self.skipped = Counter()
+        self.added = 0
+
+    def add(self, record, line=None):
+        """Откладывает запись до ``flush``.
+
+        ``line`` - номер строки файла для сообщений об ошибках, без него
+        в сообщении будет порядковый номер записи.
+        """
+        self.added += 1
+        try:
+            record = self._clean(record)
+        except ArchiveError as error:
+            where = f'Строка {line}' if line is not None else (
+                f'Запись {self.added}'
+            )
+            raise ArchiveError(f'{where}: {error}') from error
+        self.buffers[record['type']].append(record)
+
+    def _clean(self, record):
+        if not isinstance(record, dict):
+            raise ArchiveError('запись должна быть объектом.')
+        record_type = record.get('type')
+        if record_type not in self.buffers:
+            raise ArchiveError(f'неизвестный тип записи {record_type!r}.')
+        missing = [
+            field for field in REQUIRED_FIELDS[record_type]
+            if field not in record
+        ]
+        if missing:
+            raise ArchiveError(f'нет полей {", ".join(missing)}.')
+        record = dict(record)
+        try:
+            if record_type == 'post':
+                record['id'] = self._id(record.get('id'))
+                record['pub_date'] = self._date(record.get('pub_date'))
+            elif record_type == 'comment':
+                record['id'] = self._id(record.get('id'))
+                record['post'] = int(record['post'])
+                record['created'] = self._date(record.get('created'))
+        except (TypeError, ValueError) as error:
+            raise ArchiveError(f'некорректное значение ({error}).')
+        return record
+
+    def __len__(self):
+        return sum(len(buffer) for buffer in self.buffers.values())
+
+    def flush(self):
+        with transaction.atomic():
+            for record_type in RECORD_TYPES:
+                records = self.buffers[record_type]
+                if records:
+                    getattr(self, f'_save_{record_type}s')(records)
+                    records.clear()
+
+    def _resolve(self, lookup, model, field, keys):
+        missing = {key for key in keys if key and key not in lookup}
+        if missing:
+            lookup.update(
+                model.objects.filter(
+                    **{f'{field}__in': missing}
+                ).values_list(field, 'pk')
+            )
+        unknown = missing - lookup.keys()
+        if unknown:
+            raise ArchiveError(
+                f'Не найдены {model._meta.verbose_name_plural}: '
+                f'{", ".join(sorted(unknown))}'
+            )
+
+    def _skip_existing_keys(self, model, field, keys):
+        """Считает ключи, которые уже есть в БД."""
+        existing = model.objects.filter(
+            **{f'{field}__in': set(keys)}
+        ).values_list(field, flat=True)
+        self.skipped[model._meta.model_name] += len(existing)
+
+    def _new_objects(self, model, objects, fields):
+        """Объекты, которых еще нет в БД.
+
+        Объект с id уже импортированной записи (совпадают ``fields``)
+        пропускается, а занятый другой записью id - ошибка.
+        """
+        ids = Counter(obj.pk for obj in objects if obj.pk is not None)
+        existing = {
+            row[0]: row[1:]
+            for row in model.objects.filter(
+                pk__in=list(ids),
+            ).values_list('pk', *fields)
+        }
+        conflicts = {
+            obj.pk for obj in objects
+            if ids[obj.pk] > 1 or (
+                obj.pk in existing
+                and existing[obj.pk] != tuple(
+                    getattr(obj, field) for field in fields
+                )
+            )
+        }
+        if conflicts:
+            raise ArchiveError(
+                f'{model._meta.verbose_name_plural}: id '
+                f'{", ".join(map(str, sorted(conflicts)))} '
+                f'заняты другими записями.'
+            )
+        self.skipped[model._meta.model_name] += len(existing)
+        return [obj for obj in objects if obj.pk not in existing]
+
+    def _save_users(self, records):
+        usernames = [record['username'] for record in records]
+        self._skip_existing_keys(User, 'username', usernames)
+        User.objects.bulk_create(
+            [
+                User(
+                    username=record['username'],
+                    first_name=record.get('first_name', ''),
+                    last_name=record.get('last_name', ''),
+                    email=record.get('email', ''),
+                    password=make_password(None),
+                )
+                for record in records
+            ],
+            ignore_conflicts=True,
+        )
+        self._resolve(self.users, User, 'username', usernames)
+
+    def _save_groups(self, records):
+        slugs = [record['slug'] for record in records]
+        self._skip_existing_keys(Group, 'slug', slugs)
+        Group.objects.bulk_create(
+            [
+                Group(
+                    slug=record['slug'],
+                    title=record['title'],
+                    description=record.get('description', ''),
+                )
+                for record in records
+            ],
+            ignore_conflicts=True,
+        )
+        self._resolve(self.groups, Group, 'slug', slugs)
+
+    def _save_posts(self, records):
+        self._resolve(
+            self.users, User, 'username',
+            [record['author'] for record in records],
+        )
+        self._resolve(
+            self.groups, Group, 'slug',
+            [record.get('group') for record in records],
+        )
+        posts = [
+            Post(
+                id=record['id'],
+                author_id=self.users[record['author']],
+                group_id=self.groups.get(record.get('group')),
+                text=record['text'],
+                image=record.get('image', ''),
+                pub_date=record['pub_date'],
+            )
+            for record in records
+        ]
+        Post.objects.bulk_create(
+            self._new_objects(Post, posts, ('author_id', 'text')),
+        )
+
+    def _save_comments(self, records):
+        self._resolve(
+            self.users, User, 'username',
+            [record['author'] for record in records],
+        )
+        comments = [
+            Comment(
+                id=record['id'],
+                post_id=record['post'],
+                author_id=self.users[record['author']],
+                text=record['text'],
+                created=record['created'],
+            )
+            for record in records
+        ]
+        post_ids = {comment.post_id for comment in comments}
+        unknown = post_ids - set(
+            Post.objects.filter(pk__in=post_ids).values_list('pk', flat=True)
+        )
+        if unknown:
+            raise ArchiveError(
+                f'Не найдены посты: {", ".join(map(str, sorted(unknown)))}'
+            )
+        Comment.objects.bulk_create(
+            self._new_objects(
+                Comment, comments, ('post_id', 'author_id', 'text'),
+            ),
+        )
+
+    def _save_follows(self, records):
+        self._resolve(
+            self.users, User, 'username',
+            [record[field] for record in records
+             for field in ('user', 'author')],
+        )
+        Follow.objects.bulk_create(
+            [
+                Follow(
+                    user_id=self.users[record['user']],
+                    author_id=self.users[record['author']],
+                )
+                for record in records
+                if record['user'] != record['author']
+            ],
+            ignore_conflicts=True,
+        )
+
+    @staticmethod
+    def _id(value):
+        # В CSV id приходит строкой.
+        return int(value) if value not in (None, '') else None
+
+    @staticmethod
+    def _date(value):
+        if not value:
+            return timezone.now()
+        date = parse_datetime(value)
+        if date is None:
+            raise ValueError(f'некорректная дата {value!r}')
+        if timezone.is_naive(date):
+            date = timezone.make_aware(date)
+        return date
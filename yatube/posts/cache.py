@@ -0,0 +1,293 @@
+import hashlib
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import http_date, parse_http_date_safe
+
+from core.holes import SHELL_CONTEXT_FLAG, fill_holes
+
+from .feed import get_request_feed_unread
+
+VERSION_KEY_PREFIX = 'posts:version'
+PAGE_KEY_PREFIX = 'posts:page'
+HIGH_WATER_MARK_KEY_PREFIX = 'posts:hwm'
+COUNT_KEY_PREFIX = 'posts:count'
+POST_AUTHOR_KEY_PREFIX = 'posts:author'
+# Заголовки, которые сохраняются в кеше вместе с телом ответа.
+CACHED_HEADERS = ('Content-Type', 'Last-Modified')
+
+
+def index_namespace():
+    return 'index'
+
+
+def groups_namespace():
+    return 'groups'
+
+
+def group_namespace(slug):
+    return f'group:{slug}'
+
+
+def profile_namespace(username):
+    return f'profile:{username}'
+
+
+def post_namespace(post_id):
+    return f'post:{post_id}'
+
+
+def cards_namespace():
+    """Страницы с карточками постов: на них выводятся полное имя
+    автора и название группы, которые меняются без изменения постов."""
+    return 'cards'
+
+
+def post_namespaces(post):
+    """Пространства имен всех страниц, на которых выводится пост."""
+    return post_row_namespaces(
+        post.pk,
+        post.author.get_username(),
+        post.group.slug if post.group_id is not None else None,
+    )
+
+
+def post_row_namespaces(post_id, username, group_slug=None):
+    """То же, что ``post_namespaces``, по полям из ``values()``."""
+    namespaces = [
+        index_namespace(),
+        profile_namespace(username),
+        post_namespace(post_id),
+    ]
+    if group_slug is not None:
+        namespaces.append(group_namespace(group_slug))
+    return namespaces
+
+
+def _version_key(namespace):
+    return f'{VERSION_KEY_PREFIX}:{namespace}'
+
+
+def _initial_version():
+    # Версия после вытеснения ключа не должна совпасть со старой,
+    # поэтому начинаем отсчет с текущего времени в миллисекундах.
+    return int(time.time() * 1000)
+
+
+def get_versions(namespaces):
+    """Возвращает текущие версии пространств имен одним запросом к кешу."""
+    keys = [_version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(namespaces):
+    """Инвалидирует закешированные страницы пространств имен.
+
+    Внутри транзакции версии меняются только после коммита. Иначе
+    параллельный запрос прочитал бы еще старые данные и закешировал
+    их под новой версией до следующей записи.
+    """
+    namespaces = set(namespaces)
+    transaction.on_commit(lambda: _bump(namespaces))
+
+
+def _bump(namespaces):
+    for namespace in namespaces:
+        key = _version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), None)
+
+
+def versioned_key_prefix(namespaces):
+    versions = get_versions(namespaces)
+    raw = ':'.join(
+        f'{namespace}={version}'
+        for namespace, version in zip(namespaces, versions)
+    )
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def versioned_value(key, namespaces, compute):
+    """Значение ``compute()``, закешированное по версиям пространств имен.
+
+    ``compute()`` выполняется только после инвалидации, а до следующей
+    записи значение читается из кеша без запросов к БД.
+    """
+    key = f'{key}:{versioned_key_prefix(namespaces)}'
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, settings.PAGE_CACHE_TIMEOUT)
+    return value
+
+
+def high_water_mark(namespaces, compute):
+    """Отметка о последнем изменении данных пространств имен."""
+    return versioned_value(HIGH_WATER_MARK_KEY_PREFIX, namespaces, compute)
+
+
+def cached_count(namespaces, queryset):
+    """``queryset.count()``, который пересчитывается только после записи."""
+    try:
+        sql = str(queryset.query)
+    except EmptyResultSet:
+        return 0
+    query = hashlib.md5(sql.encode()).hexdigest()
+    return versioned_value(
+        f'{COUNT_KEY_PREFIX}:{query}', namespaces, queryset.count,
+    )
+
+
+def public_cached_response(request, namespaces, build, key_prefix,
+                           max_age=60):
+    """Отдает одинаковый для всех пользователей ответ из кеша.
+
+    ``build`` вызывается только при промахе. Ответ кешируется по
+    версиям ``namespaces`` и получает ETag, поэтому повторный запрос
+    с ``If-None-Match`` получает 304 без обращения к БД. Клиентам без
+    ETag 304 отдается по ``If-Modified-Since`` и сохраненному в кеше
+    ``Last-Modified`` - времени сборки ответа.
+    """
+    prefix = versioned_key_prefix(namespaces)
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    key = f'{key_prefix}:{prefix}:{path}'
+    etag = f'"{hashlib.md5(key.encode()).hexdigest()}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        cached = cache.get(key)
+        if cached is not None:
+            content, headers = cached
+            response = HttpResponse(content)
+            for header, value in headers.items():
+                response[header] = value
+        else:
+            response = build()
+            if response.status_code == 200:
+                # Версии меняются и при правке старых записей, поэтому
+                # ответ изменен не раньше, чем собран.
+                response['Last-Modified'] = http_date()
+                headers = {
+                    header: response[header]
+                    for header in CACHED_HEADERS
+                    if response.has_header(header)
+                }
+                cache.set(
+                    key,
+                    (response.content, headers),
+                    settings.PAGE_CACHE_TIMEOUT,
+                )
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=parse_http_date_safe(
+                response.get('Last-Modified', ''),
+            ),
+            response=response,
+        )
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=max_age)
+    return response
+
+
+class VersionedCacheMixin:
+    """Кеширует GET-ответ view с ключом, зависящим от версий данных.
+
+    Версии увеличиваются сигналами при изменении постов, комментариев
+    и подписок, поэтому страницы можно кешировать надолго. В кеш
+    попадает общая для всех пользователей оболочка страницы, а
+    фрагменты из ``{% hole %}`` рендерятся заново на каждый запрос.
+
+    ETag ответа строится из тех же версий и пользователя, поэтому
+    повторный запрос с ``If-None-Match`` получает 304 до выборки
+    данных и рендеринга шаблона.
+    """
+    cache_timeout = settings.PAGE_CACHE_TIMEOUT
+    # Страница выводит счетчик новых постов ленты подписок.
+    shows_feed_unread = False
+
+    def get_cache_namespaces(self):
+        raise NotImplementedError(
+            'Определите get_cache_namespaces() в подклассе.'
+        )
+
+    def get_cache_timeout(self):
+        # Разброс времени жизни, чтобы ключи не истекали одновременно.
+        return self.cache_timeout + random.randint(
+            0, self.cache_timeout // 10
+        )
+
+    def get_page_cache_key(self, prefix):
+        path = hashlib.md5(self.request.get_full_path().encode()).hexdigest()
+        return f'{PAGE_KEY_PREFIX}:{prefix}:{path}'
+
+    def get_etag(self, key):
+        # Фрагменты страницы зависят от пользователя и CSRF-токена,
+        # а на страницах с переключателем вкладок - и от счетчика новых
+        # постов ленты.
+        user = self.request.user
+        personal = ''
+        if user.is_authenticated:
+            personal = str(user.pk)
+            if self.shows_feed_unread:
+                personal += f':{get_request_feed_unread(self.request)}'
+        raw = ':'.join((
+            key,
+            personal,
+            self.request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        ))
+        return f'"{hashlib.md5(raw.encode()).hexdigest()}"'
+
+    def get_hole_context(self):
+        """Контекст для пользовательских фрагментов страницы."""
+        return {}
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        key = self.get_page_cache_key(
+            versioned_key_prefix(self.get_cache_namespaces())
+        )
+        etag = self.get_etag(key)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = self.get_page_response(key, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Cookie',))
+        return response
+
+    def get_page_response(self, key, *args, **kwargs):
+        request = self.request
+        shell = cache.get(key)
+        if shell is not None:
+            return HttpResponse(
+                fill_holes(shell, request, self.get_hole_context())
+            )
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code != 200 or not hasattr(response, 'render'):
+            return response
+        response.context_data[SHELL_CONTEXT_FLAG] = True
+        response.render()
+        shell = response.content.decode(response.charset)
+        cache.set(key, shell, self.get_cache_timeout())
+        response.content = fill_holes(
+            shell, request, self.get_hole_context()
+        )
+        return response
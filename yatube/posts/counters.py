@@ -0,0 +1,77 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Group, Post, User, UserCounters
+
+
+def _change(queryset, field, delta):
+    if delta < 0:
+        # Счетчик не уходит в минус, даже если он рассинхронизирован.
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно изменяет счетчик ``field`` у объекта ``model``."""
+    if pk is None:
+        return
+    _change(model.objects.filter(pk=pk), field, delta)
+
+
+def change_user_counter(user_id, field, delta):
+    """Изменяет счетчик пользователя, создавая строку при ее отсутствии."""
+    updated = _change(
+        UserCounters.objects.filter(user_id=user_id), field, delta
+    )
+    if not updated and delta > 0:
+        recount_users([user_id])
+
+
+def count_subquery(queryset, field):
+    """Подзапрос с количеством строк ``queryset``, сгруппированных
+    по ``field`` = OuterRef('pk')."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=Count('pk'),
+            ).values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def recount_groups():
+    return Group.objects.update(
+        posts_count=count_subquery(Post.objects, 'group'),
+    )
+
+
+def recount_posts():
+    return Post.objects.update(
+        comments_count=count_subquery(Comment.objects, 'post'),
+    )
+
+
+def recount_users(user_ids=None):
+    """Создает недостающие строки UserCounters и пересчитывает их."""
+    users = User.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    UserCounters.objects.bulk_create(
+        (
+            UserCounters(user_id=pk)
+            for pk in users.values_list('pk', flat=True).iterator()
+        ),
+        ignore_conflicts=True,
+    )
+    counters = UserCounters.objects.all()
+    if user_ids is not None:
+        counters = counters.filter(user_id__in=user_ids)
+    return counters.update(
+        posts_count=count_subquery(Post.objects, 'author'),
+        followers_count=count_subquery(Follow.objects, 'author'),
+        following_count=count_subquery(Follow.objects, 'user'),
+    )
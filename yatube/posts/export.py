@@ -0,0 +1,51 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Post
+
+EXPORT_FIELDS = ('id', 'pub_date', 'group', 'comments_count', 'text')
+EXPORT_CHUNK_SIZE = 2000
+
+
+def export_rows(author):
+    """Посты автора без создания объектов модели, чанками из БД."""
+    rows = Post.objects.filter(
+        author=author,
+    ).order_by('pk').values_list(
+        'pk', 'pub_date', 'group__slug', 'comments_count', 'text',
+    )
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield dict(zip(EXPORT_FIELDS, row))
+
+
+def iter_json(rows):
+    """JSON-массив, который отдается по одному элементу."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    yield '['
+    separator = '\n'
+    for row in rows:
+        yield separator + encoder.encode(row)
+        separator = ',\n'
+    yield '\n]\n'
+
+
+class _Echo:
+    """Файловый объект для ``csv.writer``, возвращающий строку."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([row[field] for field in EXPORT_FIELDS])
+
+
+# Формат -> (content type, генератор строк)
+EXPORT_FORMATS = {
+    'json': ('application/json', iter_json),
+    'csv': ('text/csv', iter_csv),
+}
@@ -0,0 +1,158 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from .counters import count_subquery
+from .models import FeedEntry, Follow, Post, UserCounters
+
+UNREAD_KEY_PREFIX = 'posts:unread'
+
+
+def _unread_key(user_id):
+    return f'{UNREAD_KEY_PREFIX}:{user_id}'
+
+
+def _forget_unread(user_ids):
+    """Сбрасывает закешированные счетчики после коммита: иначе
+    параллельный запрос закешировал бы еще не обновленное значение."""
+    keys = [_unread_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост в ленты всех подписчиков автора."""
+    follower_ids = list(
+        Follow.objects.filter(
+            author_id=post.author_id,
+        ).values_list('user_id', flat=True)
+    )
+    if not follower_ids:
+        return
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in follower_ids
+        ],
+        ignore_conflicts=True,
+    )
+    trim_feeds(follower_ids)
+    # Новый пост всегда свежее отметки о просмотре ленты.
+    UserCounters.objects.filter(
+        user_id__in=follower_ids,
+    ).update(feed_unread=F('feed_unread') + 1)
+    _forget_unread(follower_ids)
+
+
+def unfan_post(post):
+    """Уменьшает счетчики непрочитанных после удаления поста."""
+    user_ids = list(
+        UserCounters.objects.filter(
+            user__follower__author_id=post.author_id,
+            feed_seen_at__lt=post.pub_date,
+            feed_unread__gt=0,
+        ).values_list('user_id', flat=True)
+    )
+    if not user_ids:
+        return
+    UserCounters.objects.filter(
+        user_id__in=user_ids, feed_unread__gt=0,
+    ).update(feed_unread=F('feed_unread') - 1)
+    _forget_unread(user_ids)
+
+
+def backfill_feed(user_id, author_id):
+    """Добавляет в ленту пользователя последние посты нового автора."""
+    posts = Post.objects.filter(
+        author_id=author_id,
+    ).values_list('pk', 'pub_date')[:settings.FEED_MAX_ENTRIES]
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        ],
+        ignore_conflicts=True,
+    )
+    trim_feeds([user_id])
+    recount_feed_unread([user_id])
+
+
+def rebuild_feeds():
+    """Заполняет ленты по всем подпискам (после массового импорта)."""
+    follows = Follow.objects.values_list('user_id', 'author_id')
+    for user_id, author_id in follows.iterator():
+        backfill_feed(user_id, author_id)
+
+
+def prune_feed(user_id, author_id):
+    """Убирает из ленты пользователя посты автора после отписки."""
+    FeedEntry.objects.filter(
+        user_id=user_id,
+        post__author_id=author_id,
+    ).delete()
+    recount_feed_unread([user_id])
+
+
+def trim_feeds(user_ids):
+    """Оставляет в каждой ленте не больше FEED_MAX_ENTRIES записей."""
+    newest = FeedEntry.objects.filter(
+        user_id=OuterRef('user_id'),
+    ).order_by('-pub_date', '-pk').values('pk')[:settings.FEED_MAX_ENTRIES]
+    FeedEntry.objects.filter(
+        user_id__in=user_ids,
+    ).exclude(
+        pk__in=Subquery(newest),
+    ).delete()
+
+
+def recount_feed_unread(user_ids=None):
+    """Пересчитывает непрочитанные посты: записи ленты, опубликованные
+    после того, как пользователь последний раз ее открывал."""
+    counters = UserCounters.objects.all()
+    if user_ids is not None:
+        counters = counters.filter(user_id__in=user_ids)
+    updated = counters.update(
+        feed_unread=count_subquery(
+            FeedEntry.objects.filter(pub_date__gt=OuterRef('feed_seen_at')),
+            'user',
+        ),
+    )
+    if user_ids is not None:
+        _forget_unread(user_ids)
+    return updated
+
+
+def get_feed_unread(user_id):
+    """Число непрочитанных постов ленты: одно чтение из кеша."""
+    key = _unread_key(user_id)
+    unread = cache.get(key)
+    if unread is None:
+        unread = UserCounters.objects.filter(
+            user_id=user_id,
+        ).values_list('feed_unread', flat=True).first() or 0
+        cache.set(key, unread, settings.PAGE_CACHE_TIMEOUT)
+    return unread
+
+
+def get_request_feed_unread(request):
+    """``get_feed_unread`` текущего пользователя, запомненный на запросе.
+
+    ETag, переключатель вкладок и лента подписок спрашивают счетчик в
+    одном запросе, а кеш при этом читается только один раз.
+    """
+    if not hasattr(request, '_feed_unread'):
+        user = request.user
+        request._feed_unread = (
+            get_feed_unread(user.pk) if user.is_authenticated else 0
+        )
+    return request._feed_unread
+
+
+def mark_feed_seen(user_id):
+    """Сдвигает отметку о просмотре ленты и обнуляет счетчик."""
+    UserCounters.objects.filter(user_id=user_id).update(
+        feed_seen_at=timezone.now(),
+        feed_unread=0,
+    )
+    cache.set(_unread_key(user_id), 0, settings.PAGE_CACHE_TIMEOUT)
@@ -0,0 +1,139 @@
+from functools import partial
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+
+from .cache import (
+    cards_namespace, group_namespace, index_namespace, profile_namespace,
+    public_cached_response,
+)
+from .models import Group, Post, User
+
+FEED_KEY_PREFIX = 'posts:feed'
+
+
+class VersionedCacheFeed(Feed):
+    """Лента, закешированная по версиям пространств имен.
+
+    Как и ``VersionedCacheMixin``, кеш сбрасывается сигналами при
+    изменении постов, а ETag позволяет ответить 304 без запросов к БД.
+    """
+    # Сколько секунд прокси и клиенты могут не перепроверять ленту.
+    max_age = 60
+    query_budget = 2
+
+    def get_cache_namespaces(self, **kwargs):
+        raise NotImplementedError(
+            'Определите get_cache_namespaces() в подклассе.'
+        )
+
+    def __call__(self, request, *args, **kwargs):
+        return public_cached_response(
+            request,
+            self.get_cache_namespaces(**kwargs),
+            partial(super().__call__, request, *args, **kwargs),
+            FEED_KEY_PREFIX,
+            self.max_age,
+        )
+
+    def items(self, obj=None):
+        return self.get_queryset(obj).select_related(
+            'author', 'group',
+        )[:settings.FEED_ITEMS]
+
+    def item_title(self, item):
+        return item.text[:50]
+
+    def item_description(self, item):
+        return item.text
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.get_username()
+
+    def item_categories(self, item):
+        if item.group is None:
+            return ()
+        return (item.group.title,)
+
+
+class IndexFeed(VersionedCacheFeed):
+    title = 'Yatube: последние записи'
+    description = 'Последние записи всех пользователей.'
+
+    def link(self):
+        return reverse('posts:index')
+
+    def get_cache_namespaces(self, **kwargs):
+        return [index_namespace(), cards_namespace()]
+
+    def get_queryset(self, obj):
+        return Post.objects.all()
+
+
+class GroupFeed(VersionedCacheFeed):
+
+    def get_cache_namespaces(self, slug):
+        return [group_namespace(slug), cards_namespace()]
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, obj):
+        return f'Yatube: записи сообщества {obj.title}'
+
+    def description(self, obj):
+        return obj.description
+
+    def link(self, obj):
+        return reverse('posts:group_list', kwargs={'slug': obj.slug})
+
+    def get_queryset(self, obj):
+        return obj.posts.all()
+
+
+class ProfileFeed(VersionedCacheFeed):
+
+    def get_cache_namespaces(self, username):
+        return [profile_namespace(username), cards_namespace()]
+
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, obj):
+        return f'Yatube: записи {obj.get_full_name() or obj.get_username()}'
+
+    def description(self, obj):
+        return f'Записи пользователя {obj.get_username()}.'
+
+    def link(self, obj):
+        return reverse(
+            'posts:profile', kwargs={'username': obj.get_username()},
+        )
+
+    def get_queryset(self, obj):
+        return obj.posts.all()
+
+
+class AtomIndexFeed(IndexFeed):
+    feed_type = Atom1Feed
+    subtitle = IndexFeed.description
+
+
+class AtomGroupFeed(GroupFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+class AtomProfileFeed(ProfileFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
@@ -1,6 +1,7 @@
+from django import forms
 from django.forms import ModelForm
 
-from .models import Post, Comment
+from .models import Post, Comment, Group
 
 
 class PostForm(ModelForm):
@@ -16,4 +17,25 @@ class CommentForm(ModelForm):
 
     class Meta:
         model = Comment
-        fields = ('text',)
\ No newline at end of file
+        fields = ('text',)
+
+
+class PostSearchForm(forms.Form):
+    """Форма поиска по постам."""
+    q = forms.CharField(
+        label='Поиск',
+        max_length=200,
+        required=False,
+    )
+    group = forms.ModelChoiceField(
+        queryset=Group.objects.all(),
+        to_field_name='slug',
+        required=False,
+        label='Сообщество',
+        empty_label='Все сообщества',
+    )
+    author = forms.CharField(
+        label='Автор',
+        max_length=150,
+        required=False,
+    )
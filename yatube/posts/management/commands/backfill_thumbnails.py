@@ -0,0 +1,47 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from posts.cache import post_row_namespaces
+from posts.models import Post
+from posts.thumbnails import (
+    THUMBNAIL_GEOMETRIES, generate_thumbnails, get_ready_thumbnails,
+)
+
+
+class Command(BaseCommand):
+    help = 'Создает недостающие миниатюры картинок постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько постов проверять за одно обращение к кешу.',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        rows = Post.objects.exclude(image='').order_by('pk').values_list(
+            'pk', 'image', 'author__username', 'group__slug',
+        ).iterator(chunk_size=batch_size)
+        created = failed = 0
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            ready = get_ready_thumbnails(
+                [row[1] for row in batch], THUMBNAIL_GEOMETRIES,
+            )
+            for post_id, image, username, group_slug in batch:
+                if all(
+                    (image, alias) in ready for alias in THUMBNAIL_GEOMETRIES
+                ):
+                    continue
+                if generate_thumbnails(
+                    image, post_row_namespaces(post_id, username, group_slug),
+                ):
+                    created += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f'Пост {post_id}: нет файла {image}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Созданы миниатюры для картинок: {created}, ошибок: {failed}.'
+        ))
@@ -0,0 +1,80 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext
+
+from posts.cache import cached_count, group_namespace, index_namespace
+from posts.models import Group, Post
+from posts.paginators import WindowedPaginator
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает полный и оконный пагинатор: размер HTML, время '
+    help += 'рендеринга и запросы к БД.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--group',
+            help='Slug группы (по умолчанию - все посты, как на главной).',
+        )
+        parser.add_argument(
+            '--page', type=int,
+            help='Номер страницы (по умолчанию - средняя).',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=100,
+            help='Сколько раз повторить каждый вариант.',
+        )
+
+    def handle(self, *args, group, page, repeat, **options):
+        queryset = Post.objects.all()
+        namespaces = [index_namespace()]
+        if group is not None:
+            if not Group.objects.filter(slug=group).exists():
+                raise CommandError(f'Группа {group!r} не найдена.')
+            queryset = queryset.filter(group__slug=group)
+            namespaces = [group_namespace(group)]
+        per_page = settings.POSTS_PER_PAGE
+
+        def full():
+            paginator = WindowedPaginator(queryset, per_page)
+            paginator.window = None
+            return paginator
+
+        def windowed():
+            return WindowedPaginator(
+                queryset, per_page, count=cached_count(namespaces, queryset),
+            )
+
+        # Прогреваем кеш, чтобы замерить установившийся режим.
+        total = windowed().count
+        num_pages = max((total + per_page - 1) // per_page, 1)
+        number = min(page or (num_pages + 1) // 2, num_pages)
+        self.stdout.write(
+            f'Постов: {total}, страниц: {num_pages}, страница: {number}, '
+            f'повторов: {repeat}'
+        )
+        for label, make_paginator in (('полный', full), ('оконный', windowed)):
+            elapsed = 0.0
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    page_obj = make_paginator().page(number)
+                    html = render_to_string(
+                        'posts/includes/paginator.html',
+                        {'page_obj': page_obj, 'page_query': ''},
+                    )
+                    elapsed += time.perf_counter() - started
+            count_queries = [
+                query for query in queries
+                if 'COUNT(' in query['sql'].upper()
+            ]
+            self.stdout.write(
+                f'{label:>8}: {len(html.encode())} байт HTML, '
+                f'ссылок {html.count("<li")}, '
+                f'запросов COUNT {len(count_queries)}, '
+                f'{elapsed / repeat * 1000:.3f} мс на страницу'
+            )
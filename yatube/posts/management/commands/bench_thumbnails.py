@@ -0,0 +1,88 @@
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Post
+from posts.thumbnails import get_ready_thumbnail, get_ready_thumbnails
+
+CACHE_METHODS = ('get', 'get_many', 'set', 'set_many')
+
+
+@contextmanager
+def count_cache_calls(cache):
+    """Считает обращения к кешу."""
+    calls = {'total': 0}
+
+    def counting(method):
+        def wrapper(*args, **kwargs):
+            calls['total'] += 1
+            return method(*args, **kwargs)
+        return wrapper
+
+    for name in CACHE_METHODS:
+        setattr(cache, name, counting(getattr(cache, name)))
+    try:
+        yield calls
+    finally:
+        for name in CACHE_METHODS:
+            delattr(cache, name)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает поштучный и пакетный поиск миниатюр для страницы.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', type=int, default=settings.POSTS_PER_PAGE,
+            help='Число постов с картинками на странице.',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=100,
+            help='Сколько раз повторить каждый вариант.',
+        )
+
+    def handle(self, *args, posts, repeat, **options):
+        images = [
+            post.image for post in Post.objects.exclude(image='')[:posts]
+        ]
+        if not images:
+            self.stderr.write('Нет постов с картинками.')
+            return
+        aliases = ('card',)
+        page_cache = caches['default']
+
+        def per_post():
+            for image in images:
+                for alias in aliases:
+                    get_ready_thumbnail(image, alias)
+
+        def batched():
+            get_ready_thumbnails(images, aliases)
+
+        self.stdout.write(
+            f'Постов с картинками: {len(images)}, повторов: {repeat}'
+        )
+        results = {}
+        for label, run in (('поштучно', per_post), ('пакетно', batched)):
+            elapsed = 0.0
+            for _ in range(repeat):
+                with count_cache_calls(page_cache) as calls, \
+                        CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    run()
+                    elapsed += time.perf_counter() - started
+            results[label] = calls['total'] + len(queries)
+            self.stdout.write(
+                f'{label:>9}: обращений к кешу {calls["total"]}, '
+                f'запросов к БД {len(queries)}, '
+                f'{elapsed / repeat * 1000:.3f} мс на страницу'
+            )
+        saved = results['поштучно'] - results['пакетно']
+        self.stdout.write(self.style.SUCCESS(
+            f'Пакетный поиск экономит {saved} обращений на страницу.'
+        ))
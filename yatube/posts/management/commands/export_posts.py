@@ -0,0 +1,32 @@
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import EXPORT_FORMATS, export_rows
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Потоково выгружает посты пользователя в JSON или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument(
+            '--format', dest='export_format', default='json',
+            choices=sorted(EXPORT_FORMATS),
+        )
+        parser.add_argument(
+            '--output', help='Файл для выгрузки (по умолчанию stdout).',
+        )
+
+    def handle(self, *args, username, export_format, output, **options):
+        try:
+            author = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {username} не найден.')
+        chunks = EXPORT_FORMATS[export_format][1](export_rows(author))
+        if output is None:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(output, 'w', newline='', encoding='utf-8') as file:
+            file.writelines(chunks)
@@ -0,0 +1,151 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.archive import (
+    ArchiveError, Importer, explicit_dates, rebuild_denormalized,
+)
+
+
+def read_jsonl(file):
+    """Записи файла вместе с номерами их строк."""
+    for number, line in enumerate(file, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as error:
+            raise ArchiveError(
+                f'Строка {number}: некорректный JSON ({error.msg}).'
+            )
+        yield number, record
+
+
+def read_csv(file):
+    reader = csv.DictReader(file)
+    for row in reader:
+        yield reader.line_num, {
+            key: value for key, value in row.items() if value != ''
+        }
+
+
+READERS = {
+    '.jsonl': read_jsonl,
+    '.csv': read_csv,
+}
+
+SKIPPED_NAMES = {
+    'user': 'пользователей',
+    'group': 'групп',
+    'post': 'постов',
+    'comment': 'комментариев',
+}
+
+
+class Command(BaseCommand):
+    help = 'Потоково импортирует пользователей, группы, посты, '
+    help += 'комментарии и подписки из JSONL или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл .jsonl или .csv.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько записей сохранять в одной транзакции.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки (по умолчанию <path>.checkpoint).',
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить с контрольной точки после сбоя.',
+        )
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help='Не пересчитывать счетчики, ленты и поисковый индекс.',
+        )
+
+    def handle(self, *args, path, batch_size, checkpoint, resume,
+               no_rebuild, **options):
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in READERS:
+            raise CommandError('Поддерживаются только файлы .jsonl и .csv.')
+        checkpoint = checkpoint or f'{path}.checkpoint'
+        done = self._read_checkpoint(checkpoint, path) if resume else 0
+        importer = Importer()
+        self.started = time.monotonic()
+        imported = 0
+        try:
+            with open(path, newline='', encoding='utf-8') as file, \
+                    explicit_dates():
+                records = islice(READERS[extension](file), done, None)
+                for line, record in records:
+                    importer.add(record, line)
+                    if len(importer) >= batch_size:
+                        imported += self._flush(importer, imported)
+                        self._write_checkpoint(
+                            checkpoint, path, done + imported,
+                        )
+                imported += self._flush(importer, imported)
+        except ArchiveError as error:
+            raise CommandError(str(error))
+        self._report_skipped(importer.skipped)
+        if not no_rebuild:
+            self._rebuild()
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано записей: {imported} за {elapsed:.1f} с '
+            f'({self._rate(imported)} записей/с).'
+        ))
+
+    def _flush(self, importer, imported):
+        count = len(importer)
+        importer.flush()
+        self.stdout.write(
+            f'Записей: {imported + count} '
+            f'({self._rate(imported + count)} записей/с)'
+        )
+        return count
+
+    def _report_skipped(self, skipped):
+        if +skipped:
+            self.stdout.write(self.style.WARNING(
+                'Пропущено уже существующих: ' + ', '.join(
+                    f'{SKIPPED_NAMES[name]} {skipped[name]}'
+                    for name in SKIPPED_NAMES if skipped[name]
+                ) + '.'
+            ))
+
+    def _rate(self, records):
+        elapsed = time.monotonic() - self.started
+        return f'{records / max(elapsed, 1e-6):.0f}'
+
+    @staticmethod
+    def _read_checkpoint(checkpoint, path):
+        try:
+            with open(checkpoint) as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return 0
+        if state['path'] != os.path.abspath(path):
+            raise CommandError('Контрольная точка от другого файла.')
+        return state['records']
+
+    @staticmethod
+    def _write_checkpoint(checkpoint, path, records):
+        temporary = f'{checkpoint}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump({'path': os.path.abspath(path), 'records': records},
+                      file)
+        os.replace(temporary, checkpoint)
+
+    def _rebuild(self):
+        self.stdout.write('Пересчет счетчиков, лент и поискового индекса...')
+        rebuild_denormalized()
@@ -0,0 +1,484 @@
+import json
+import math
+import os
+import platform
+import random
+import tempfile
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+from importlib import import_module
+from io import BytesIO
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+import django
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Max
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from posts.archive import Importer, explicit_dates, rebuild_denormalized
+from posts.models import Post, User
+from yatube.wsgi import application
+
+# Модули, все именованные URL которых входят в нагрузочный тест.
+URL_MODULES = ('posts.urls', 'users.urls', 'about.urls')
+USERNAME_PREFIX = 'bench'
+WORDS = (
+    'вечер', 'город', 'дорога', 'книга', 'море', 'облако', 'поезд',
+    'река', 'сад', 'солнце', 'утро', 'чай',
+)
+SEARCH_WORD = WORDS[0]
+PERCENTILES = (50, 95, 99)
+# Запросы, которые отличаются от простого GET.
+REQUEST_OPTIONS = {
+    'posts:search': {'query': {'q': SEARCH_WORD}},
+    'posts:add_comment': {
+        'method': 'POST',
+        'data': {'text': 'Комментарий нагрузочного теста'},
+    },
+    # Выход завершает сессию, поэтому каждый запрос идет с новой.
+    'users:logout': {'fresh_session': True},
+}
+# URL, которые открываются только для своего профиля.
+OWN_PROFILE_URLS = ('posts:profile_export',)
+
+
+def named_urls():
+    """Имена URL из ``URL_MODULES`` и имена их параметров."""
+    for module_name in URL_MODULES:
+        module = import_module(module_name)
+        for pattern in module.urlpatterns:
+            if pattern.name:
+                yield (
+                    f'{module.app_name}:{pattern.name}',
+                    list(pattern.pattern.converters),
+                )
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    index = math.ceil(percent / 100 * len(ordered)) - 1
+    return ordered[max(index, 0)]
+
+
+def change(current, previous):
+    """Изменение относительно базового значения, в процентах."""
+    if not previous:
+        return math.inf if current else 0.0
+    return (current - previous) / previous * 100
+
+
+class Dataset:
+    """Синтетические пользователи, группы, посты, комментарии и подписки.
+
+    Записи сохраняет ``posts.archive.Importer``, как и ``import_archive``,
+    после чего так же пересчитываются счетчики, ленты и поисковый индекс.
+    Первый пользователь - тот, от чьего имени идут запросы с авторизацией.
+    """
+
+    def __init__(self, users, groups, posts, comments, follows, seed):
+        if users < 2 or groups < 1 or posts < 1:
+            raise CommandError(
+                'Нужны хотя бы два пользователя, одна группа и один пост.'
+            )
+        self.usernames = [f'{USERNAME_PREFIX}-{i}' for i in range(users)]
+        self.slugs = [f'{USERNAME_PREFIX}-group-{i}' for i in range(groups)]
+        self.posts = posts
+        self.comments = comments
+        self.follows = min(follows, users - 1)
+        self.seed = seed
+
+    def as_dict(self):
+        return {
+            'users': len(self.usernames),
+            'groups': len(self.slugs),
+            'posts': self.posts,
+            'comments': self.comments,
+            'follows': self.follows,
+            'seed': self.seed,
+        }
+
+    def records(self, first_post_id):
+        rng = random.Random(self.seed)
+        for username in self.usernames:
+            yield {'type': 'user', 'username': username}
+        for slug in self.slugs:
+            yield {'type': 'group', 'slug': slug, 'title': slug}
+        now = timezone.now()
+        for number in range(self.posts):
+            post_id = first_post_id + number
+            yield {
+                'type': 'post',
+                'id': post_id,
+                'author': self.usernames[number % len(self.usernames)],
+                'group': rng.choice(self.slugs),
+                'text': ' '.join(rng.choices(WORDS, k=12)),
+                'pub_date': (
+                    now - timedelta(minutes=self.posts - number)
+                ).isoformat(),
+            }
+            for _ in range(self.comments):
+                yield {
+                    'type': 'comment',
+                    'post': post_id,
+                    'author': rng.choice(self.usernames),
+                    'text': ' '.join(rng.choices(WORDS, k=6)),
+                }
+        for username in self.usernames:
+            others = [name for name in self.usernames if name != username]
+            for author in rng.sample(others, self.follows):
+                yield {'type': 'follow', 'user': username, 'author': author}
+
+    def seed_database(self, batch_size=1000):
+        if User.objects.filter(username__in=self.usernames).exists():
+            raise CommandError(
+                'В базе уже есть пользователи нагрузочного теста.'
+            )
+        last_id = Post.objects.aggregate(last=Max('id'))['last'] or 0
+        importer = Importer()
+        with explicit_dates():
+            for record in self.records(last_id + 1):
+                importer.add(record)
+                if len(importer) >= batch_size:
+                    importer.flush()
+            importer.flush()
+        rebuild_denormalized()
+
+
+class Scenario:
+    """Один URL, запрашиваемый анонимно или от имени пользователя."""
+
+    def __init__(self, name, path, authenticated, method='GET', query=None,
+                 data=None, fresh_session=False):
+        self.name = name
+        self.path = path
+        self.authenticated = authenticated
+        self.method = method
+        self.query = query or {}
+        self.data = data or {}
+        self.fresh_session = fresh_session
+
+    @property
+    def key(self):
+        return f'{self.name} {"auth" if self.authenticated else "anon"}'
+
+
+def build_scenarios(dataset):
+    user = User.objects.get(username=dataset.usernames[0])
+    other = User.objects.get(username=dataset.usernames[1])
+    values = {
+        'username': other.get_username(),
+        'slug': dataset.slugs[0],
+        'post_id': Post.objects.filter(author=user).latest('pk').pk,
+        # Токен сброса пароля для пользователя, который не входит в
+        # систему: вход меняет last_login и отзывает токен.
+        'uidb64': urlsafe_base64_encode(force_bytes(other.pk)),
+        'token': default_token_generator.make_token(other),
+    }
+    scenarios = []
+    for name, params in named_urls():
+        missing = set(params) - values.keys()
+        if missing:
+            raise CommandError(
+                f'Нет значений параметров {", ".join(sorted(missing))} '
+                f'для URL {name}.'
+            )
+        kwargs = {param: values[param] for param in params}
+        if name in OWN_PROFILE_URLS:
+            kwargs['username'] = user.get_username()
+        path = reverse(name, kwargs=kwargs)
+        for authenticated in (False, True):
+            scenarios.append(Scenario(
+                name, path, authenticated, **REQUEST_OPTIONS.get(name, {}),
+            ))
+    return user, scenarios
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class WSGIDriver:
+    """Отправляет запросы напрямую в WSGI-приложение ``yatube.wsgi``."""
+
+    def __init__(self, user, queries):
+        self.user = user
+        self.queries = queries
+        self.session = self.login()
+        request = HttpRequest()
+        self.csrf_token = get_token(request)
+        self.csrf_cookie = request.META['CSRF_COOKIE']
+
+    def login(self):
+        client = Client()
+        client.force_login(self.user)
+        return client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def environ(self, scenario):
+        cookies = {settings.CSRF_COOKIE_NAME: self.csrf_cookie}
+        if scenario.authenticated:
+            cookies[settings.SESSION_COOKIE_NAME] = (
+                self.login() if scenario.fresh_session else self.session
+            )
+        body = urlencode(scenario.data).encode()
+        environ = {
+            'REQUEST_METHOD': scenario.method,
+            'PATH_INFO': scenario.path,
+            'QUERY_STRING': urlencode(scenario.query),
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+            'CONTENT_LENGTH': str(len(body)),
+            'HTTP_COOKIE': '; '.join(
+                f'{name}={value}' for name, value in cookies.items()
+            ),
+            'HTTP_X_CSRFTOKEN': self.csrf_token,
+            'wsgi.input': BytesIO(body),
+        }
+        setup_testing_defaults(environ)
+        return environ
+
+    def request(self, scenario):
+        """Время ответа в секундах, код ответа и число SQL-запросов."""
+        environ = self.environ(scenario)
+        statuses = []
+
+        def start_response(status, headers, exc_info=None):
+            statuses.append(int(status.split()[0]))
+            return lambda data: None
+
+        self.queries.count = 0
+        started = time.perf_counter()
+        response = application(environ, start_response)
+        try:
+            for _ in response:
+                pass
+        finally:
+            response.close()
+        return time.perf_counter() - started, statuses[0], self.queries.count
+
+
+def summarize(samples):
+    """Перцентили времени ответа, RPS и SQL-запросы по замерам."""
+    timings = [seconds for seconds, _, _ in samples]
+    queries = [count for _, _, count in samples]
+    summary = {
+        'requests': len(samples),
+        'rps': round(len(samples) / max(sum(timings), 1e-9), 1),
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+    }
+    for percent in PERCENTILES:
+        summary[f'p{percent}_ms'] = round(
+            percentile(timings, percent) * 1000, 3,
+        )
+    summary['queries'] = round(sum(queries) / len(queries), 2)
+    summary['queries_max'] = max(queries)
+    summary['statuses'] = {
+        str(status): count
+        for status, count in sorted(Counter(
+            status for _, status, _ in samples
+        ).items())
+    }
+    return summary
+
+
+@contextmanager
+def isolated_environment(in_place):
+    """Временные кеш и каталоги метрик, а без ``in_place`` - и временная БД.
+
+    Запросы теста не должны попадать в кеш и метрики рабочего сервера,
+    а закешированные страницы реальных данных - в ответы теста.
+    """
+    with tempfile.TemporaryDirectory() as directory, ExitStack() as stack:
+        stack.enter_context(override_settings(
+            CACHES={'default': {
+                **settings.CACHES['default'],
+                'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+            }},
+            METRICS_DIR=os.path.join(directory, 'metrics'),
+            PROFILING_DIR=os.path.join(directory, 'profiles'),
+        ))
+        if not in_place:
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False,
+            )
+            stack.callback(
+                connection.creation.destroy_test_db, old_name, verbosity=0,
+            )
+        yield
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест: заполняет БД синтетическими данными и '
+    help += 'запрашивает все именованные URL posts, users и about через '
+    help += 'WSGI-приложение, анонимно и с авторизацией. Запросы идут '
+    help += 'последовательно в одном процессе.'
+
+    def add_arguments(self, parser):
+        dataset = parser.add_argument_group('данные')
+        dataset.add_argument('--users', type=int, default=50)
+        dataset.add_argument('--groups', type=int, default=5)
+        dataset.add_argument('--posts', type=int, default=2000)
+        dataset.add_argument(
+            '--comments', type=int, default=3, help='Комментариев на пост.',
+        )
+        dataset.add_argument(
+            '--follows', type=int, default=10,
+            help='Подписок у каждого пользователя.',
+        )
+        dataset.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Замеряемых запросов на сценарий.',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Незамеряемых запросов на сценарий перед замером.',
+        )
+        parser.add_argument(
+            '--only', action='append', default=[],
+            help='Только URL, в имени которых есть подстрока '
+                 '(можно повторять).',
+        )
+        parser.add_argument(
+            '--output', help='Файл для результатов в JSON.',
+        )
+        parser.add_argument(
+            '--baseline', help='JSON предыдущего прогона для сравнения.',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=10.0,
+            help='Допустимый рост p95 и числа запросов к БД, в процентах.',
+        )
+        parser.add_argument(
+            '--in-place', action='store_true',
+            help='Заполнять текущую БД вместо временной тестовой.',
+        )
+
+    def handle(self, *args, requests, warmup, only, output, baseline,
+               tolerance, in_place, **options):
+        if requests < 1:
+            raise CommandError('--requests должно быть не меньше 1.')
+        dataset = Dataset(
+            options['users'], options['groups'], options['posts'],
+            options['comments'], options['follows'], options['seed'],
+        )
+        baseline = self._read_baseline(baseline) if baseline else None
+        with isolated_environment(in_place):
+            self.stdout.write('Заполнение базы...')
+            dataset.seed_database()
+            user, scenarios = build_scenarios(dataset)
+            scenarios = [
+                scenario for scenario in scenarios
+                if not only or any(part in scenario.name for part in only)
+            ]
+            results = self._run(user, scenarios, requests, warmup)
+        results['dataset'] = dataset.as_dict()
+        results['environment']['isolated'] = not in_place
+        self._report(results)
+        if output:
+            with open(output, 'w') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        if baseline is not None:
+            self._compare(results, baseline, tolerance)
+
+    def _run(self, user, scenarios, requests, warmup):
+        queries = QueryCounter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(queries)
+                )
+            driver = WSGIDriver(user, queries)
+            results = {}
+            every_sample = []
+            for scenario in scenarios:
+                for _ in range(warmup):
+                    driver.request(scenario)
+                samples = [
+                    driver.request(scenario) for _ in range(requests)
+                ]
+                every_sample.extend(samples)
+                results[scenario.key] = {
+                    'url': scenario.path,
+                    'method': scenario.method,
+                    **summarize(samples),
+                }
+        return {
+            'created': timezone.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'requests': requests,
+            'warmup': warmup,
+            'scenarios': results,
+            'total': summarize(every_sample) if every_sample else {},
+        }
+
+    @staticmethod
+    def _read_baseline(path):
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+
+    def _report(self, results):
+        self.stdout.write(
+            f'{"сценарий":<36} {"коды":<10} {"rps":>8} {"p50, мс":>9} '
+            f'{"p95, мс":>9} {"p99, мс":>9} {"SQL":>6}'
+        )
+        rows = list(results['scenarios'].items())
+        if results['total']:
+            rows.append(('всего', results['total']))
+        for key, row in rows:
+            statuses = ','.join(row['statuses'])
+            self.stdout.write(
+                f'{key:<36} {statuses:<10} {row["rps"]:>8} '
+                f'{row["p50_ms"]:>9} {row["p95_ms"]:>9} '
+                f'{row["p99_ms"]:>9} {row["queries"]:>6}'
+            )
+            if any(status.startswith('5') for status in row['statuses']):
+                self.stderr.write(self.style.WARNING(
+                    f'{key}: ответы с ошибкой сервера.'
+                ))
+
+    def _compare(self, results, baseline, tolerance):
+        """Сравнивает p95 и число запросов к БД с базовым прогоном."""
+        regressions = []
+        for key, row in results['scenarios'].items():
+            previous = baseline.get('scenarios', {}).get(key)
+            if previous is None:
+                continue
+            p95 = change(row['p95_ms'], previous['p95_ms'])
+            queries = change(row['queries'], previous['queries'])
+            self.stdout.write(
+                f'{key:<36} p95 {p95:+.1f}%, SQL {queries:+.1f}%, '
+                f'rps {previous["rps"]} -> {row["rps"]}'
+            )
+            if p95 > tolerance or queries > tolerance:
+                regressions.append(key)
+        if regressions:
+            raise CommandError(
+                f'Регрессия больше {tolerance}%: {", ".join(regressions)}'
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
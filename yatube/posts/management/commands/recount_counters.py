@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import recount_groups, recount_posts, recount_users
+from posts.feed import recount_feed_unread
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики постов, комментариев '
+    help += 'и подписок.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            groups = recount_groups()
+            posts = recount_posts()
+            users = recount_users()
+            recount_feed_unread()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано: групп {groups}, постов {posts}, '
+            f'пользователей {users}.'
+        ))
@@ -0,0 +1,49 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+import posts.models
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE posts_post_fts USING fts5("
+        "text, tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        'INSERT INTO posts_post_fts (rowid, text) '
+        'SELECT id, text FROM posts_post'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS posts_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSearch',
+            fields=[
+                ('post', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search', serialize=False, to='posts.Post', verbose_name='Пост')),
+                ('text', posts.models.SearchTextField(verbose_name='Текст')),
+                ('rank', models.FloatField(verbose_name='Релевантность')),
+            ],
+            options={
+                'verbose_name': 'Поисковый индекс поста',
+                'verbose_name_plural': 'Поисковый индекс постов',
+                'db_table': 'posts_post_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
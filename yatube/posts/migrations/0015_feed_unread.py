@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:44
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounters',
+            name='feed_seen_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Лента просмотрена'),
+        ),
+        migrations.AddField(
+            model_name='usercounters',
+            name='feed_unread',
+            field=models.PositiveIntegerField(default=0, verbose_name='Непрочитанные посты в ленте'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.db import models
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -20,6 +21,11 @@ class Group(models.Model):
     description = models.TextField(
         verbose_name='Описание',
     )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество постов',
+    )
 
     def __str__(self):
         return self.title
@@ -35,6 +41,10 @@ class Post(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -55,11 +65,44 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True,
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев',
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = (
+            # id в конце индексов нужен для сортировки и курсоров
+            # пагинации (pub_date, id): обходом индекса в любую сторону.
+            models.Index(
+                fields=('pub_date', 'id'),
+                name='post_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('author', 'pub_date', 'id'),
+                name='post_author_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('group', 'pub_date', 'id'),
+                name='post_group_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('updated', 'id'),
+                name='post_updated_idx',
+            ),
+            models.Index(
+                fields=('author', 'updated', 'id'),
+                name='post_author_updated_idx',
+            ),
+            models.Index(
+                fields=('group', 'updated', 'id'),
+                name='post_group_updated_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -68,6 +111,49 @@ class Post(models.Model):
         return reverse('posts:post_detail', kwargs={'post_id': self.pk})
 
 
+class SearchTextField(models.TextField):
+    """Столбец полнотекстовой таблицы SQLite FTS5."""
+
+
+@SearchTextField.register_lookup
+class Match(models.Lookup):
+    """Полнотекстовый поиск: ``field__match='запрос'``."""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class PostSearch(models.Model):
+    """Полнотекстовый индекс постов (виртуальная таблица FTS5).
+
+    Таблица создается миграцией, а строки поддерживаются сигналами
+    сохранения и удаления поста, ``rowid`` совпадает с id поста.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search',
+        verbose_name='Пост',
+    )
+    text = SearchTextField(
+        verbose_name='Текст',
+    )
+    rank = models.FloatField(
+        verbose_name='Релевантность',
+    )
+
+    class Meta:
+        managed = False
+        db_table = 'posts_post_fts'
+        verbose_name = 'Поисковый индекс поста'
+        verbose_name_plural = 'Поисковый индекс постов'
+
+
 class Comment(models.Model):
     """Модель для комментариев."""
 
@@ -93,8 +179,19 @@ class Comment(models.Model):
     )
 
     class Meta:
+        ordering = ('created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = (
+            models.Index(
+                fields=('post', 'created'),
+                name='comment_post_created_idx',
+            ),
+            models.Index(
+                fields=('created',),
+                name='comment_created_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -121,4 +218,86 @@ class Follow(models.Model):
 
     class Meta:
         verbose_name = 'Подписка'
-        verbose_name_plural = 'Подписки'
\ No newline at end of file
+        verbose_name_plural = 'Подписки'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow',
+            ),
+        )
+
+
+class UserCounters(models.Model):
+    """Денормализованные счетчики пользователя."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество постов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписок',
+    )
+    feed_unread = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Непрочитанные посты в ленте',
+    )
+    feed_seen_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Лента просмотрена',
+    )
+
+    class Meta:
+        verbose_name = 'Счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class FeedEntry(models.Model):
+    """Материализованная лента подписок: пост автора у подписчика."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пользователь',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        ordering = ('-pub_date',)
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        indexes = (
+            models.Index(
+                fields=('user', 'pub_date', 'post'),
+                name='feed_user_pub_date_idx',
+            ),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_feed_entry',
+            ),
+        )
@@ -0,0 +1,291 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+from datetime import datetime
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorPage(Sequence):
+    """Страница keyset-пагинации.
+
+    Повторяет интерфейс ``django.core.paginator.Page`` в той части,
+    которая нужна шаблонам, но вместо номеров страниц отдает курсоры.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} items>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    # У пустой страницы (курсор за последним объектом) соседних
+    # курсоров нет, остается только ссылка на первую страницу.
+    @property
+    def next_cursor(self):
+        if not self.has_next() or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous() or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0])
+
+
+class CursorPaginator:
+    """Keyset-пагинатор: страницы выбираются по условию на поля сортировки.
+
+    В отличие от ``Paginator`` не выполняет ``COUNT(*)`` и ``OFFSET``,
+    поэтому стоимость запроса не зависит от глубины страницы.
+    Последнее поле в ``ordering`` должно быть уникальным.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+
+    def page(self, before=None, after=None):
+        """Возвращает страницу после курсора ``before`` (более старые
+        объекты) или перед курсором ``after`` (более новые объекты)."""
+        if before and after:
+            raise InvalidCursor('Нельзя указывать before и after вместе.')
+        if after:
+            return self._page_after(self.decode_cursor(after))
+        queryset = self.object_list.order_by(*self.ordering)
+        if before:
+            values = self.decode_cursor(before)
+            queryset = queryset.filter(self._keyset_filter(values))
+        object_list = list(queryset[:self.per_page + 1])
+        has_next = len(object_list) > self.per_page
+        return CursorPage(
+            object_list[:self.per_page],
+            self,
+            has_next=has_next,
+            has_previous=bool(before),
+        )
+
+    def _page_after(self, values):
+        reverse_ordering = [self._reverse(field) for field in self.ordering]
+        queryset = self.object_list.order_by(*reverse_ordering).filter(
+            self._keyset_filter(values, reverse=True)
+        )
+        object_list = list(queryset[:self.per_page + 1])
+        has_previous = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        object_list.reverse()
+        return CursorPage(
+            object_list,
+            self,
+            has_next=True,
+            has_previous=has_previous,
+        )
+
+    def _keyset_filter(self, values, reverse=False):
+        """Строит условие «строго после курсора» для сортировки
+        ``ordering`` (или обратной ей при ``reverse=True``).
+
+        Кроме цепочки OR условие содержит избыточную границу по первому
+        полю: по ней БД выбирает диапазон индекса и читает только
+        строки страницы, а не объединяет результаты нескольких поисков.
+        """
+        first = self.ordering[0]
+        lookup = 'lte' if first.startswith('-') != reverse else 'gte'
+        bound = Q(**{f'{first.lstrip("-")}__{lookup}': values[0]})
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            branch = Q(**{f'{name}__{lookup}': values[index]})
+            for prev_field, value in zip(self.ordering[:index], values):
+                branch &= Q(**{prev_field.lstrip('-'): value})
+            condition |= branch
+        return bound & condition
+
+    @staticmethod
+    def _reverse(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def _field_names(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def _get_field(self, name):
+        # Сортировать можно и по аннотации с полем связанной модели.
+        annotation = self.object_list.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.object_list.model._meta.get_field(name)
+
+    def encode_cursor(self, obj):
+        # Объект модели или строка из ``values()``.
+        get = obj.get if isinstance(obj, dict) else partial(getattr, obj)
+        values = [
+            self._serialize(get(name))
+            for name in self._field_names()
+        ]
+        raw = json.dumps(values)
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def _serialize(value):
+        # DjangoJSONEncoder обрезает микросекунды, а они нужны для
+        # точного сравнения с курсором.
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError, UnicodeError):
+            raise InvalidCursor('Некорректный курсор.')
+        names = self._field_names()
+        if not isinstance(values, list) or len(values) != len(names):
+            raise InvalidCursor('Некорректный курсор.')
+        try:
+            return [
+                self._to_python(self._get_field(name), value)
+                for name, value in zip(names, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise InvalidCursor('Некорректный курсор.')
+
+    @staticmethod
+    def _to_python(field, value):
+        # Значения курсора приходят от клиента: приводим их к типу поля,
+        # чтобы некорректные не дошли до ORM.
+        if value is None or isinstance(value, (bool, list, dict)):
+            raise ValueError(value)
+        value = field.to_python(value)
+        if (
+            isinstance(value, datetime)
+            and settings.USE_TZ
+            and timezone.is_naive(value)
+        ):
+            raise ValueError(value)
+        return value
+
+
+def estimate_count(model, using='default'):
+    """Примерное число строк таблицы без ``COUNT(*)``.
+
+    Берет статистику планировщика (``sqlite_stat1`` после ANALYZE или
+    ``pg_class.reltuples``), а без нее - максимальный первичный ключ,
+    который читается из индекса за один шаг.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone() is not None:
+                cursor.execute(
+                    'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                    [table],
+                )
+                row = cursor.fetchone()
+                if row is not None:
+                    return int(row[0].split()[0])
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [table],
+            )
+            row = cursor.fetchone()
+            if row is not None and row[0] > 0:
+                return row[0]
+    return model._default_manager.using(using).aggregate(
+        last_pk=Max('pk'),
+    )['last_pk'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для больших таблиц.
+
+    Для нефильтрованного queryset вместо точного ``COUNT(*)`` берет
+    оценку ``estimate_count``, если таблица больше
+    ``exact_count_threshold`` строк. Отфильтрованные queryset считаются
+    точно: фильтры админки опираются на индексы.
+    """
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimate_count(
+                self.object_list.model, self.object_list.db,
+            )
+            if estimate > self.exact_count_threshold:
+                return estimate
+        return super().count
+
+
+class WindowedPage(Page):
+
+    @property
+    def page_window(self):
+        """Номера страниц вокруг текущей для ссылок пагинатора."""
+        return self.paginator.get_window(self.number)
+
+
+class WindowedPaginator(Paginator):
+    """Paginator, который выводит только окно номеров страниц.
+
+    Общее число объектов можно передать в ``count`` (денормализованный
+    счетчик или закешированное значение), тогда ``COUNT(*)`` не
+    выполняется. При ``window = None`` выводятся все страницы.
+    """
+    window = 3
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.count = count
+
+    def get_window(self, number):
+        if self.window is None:
+            return self.page_range
+        return range(
+            max(number - self.window, 1),
+            min(number + self.window, self.num_pages) + 1,
+        )
+
+    def _get_page(self, *args, **kwargs):
+        return WindowedPage(*args, **kwargs)
@@ -0,0 +1,82 @@
+import re
+
+from django.db import connection
+
+from .models import Post, PostSearch
+
+# Слова запроса; служебный синтаксис FTS5 из пользовательского ввода
+# не передается.
+WORD_RE = re.compile(r'\w+')
+
+
+def search_available():
+    """Полнотекстовый индекс есть только в SQLite (FTS5)."""
+    return connection.vendor == 'sqlite'
+
+
+def to_match_query(text):
+    """Превращает пользовательский ввод в запрос FTS5.
+
+    Каждое слово ищется как отдельная фраза, все слова должны
+    встретиться в тексте; последнее слово ищется по префиксу.
+    """
+    words = WORD_RE.findall(text)
+    if not words:
+        return ''
+    phrases = [f'"{word}"' for word in words]
+    phrases[-1] += '*'
+    return ' '.join(phrases)
+
+
+def index_post(post):
+    """Добавляет или обновляет пост в поисковом индексе."""
+    if not search_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {PostSearch._meta.db_table} WHERE rowid = %s',
+            [post.pk],
+        )
+        cursor.execute(
+            f'INSERT INTO {PostSearch._meta.db_table} (rowid, text) '
+            f'VALUES (%s, %s)',
+            [post.pk, post.text],
+        )
+
+
+def unindex_post(post_id):
+    if not search_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {PostSearch._meta.db_table} WHERE rowid = %s',
+            [post_id],
+        )
+
+
+def rebuild_search_index():
+    """Заново строит индекс по всем постам (после массового импорта)."""
+    if not search_available():
+        return
+    table = PostSearch._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table}')
+        cursor.execute(
+            f'INSERT INTO {table} (rowid, text) '
+            f'SELECT id, text FROM {Post._meta.db_table}'
+        )
+
+
+def search_posts(queryset, text):
+    """Посты ``queryset``, содержащие слова ``text``, по релевантности.
+
+    Без FTS5 откатывается на ``icontains``.
+    """
+    match = to_match_query(text)
+    if not match:
+        return queryset.none()
+    if not search_available():
+        return queryset.filter(text__icontains=text)
+    return queryset.filter(
+        search__text__match=match,
+    ).order_by('search__rank', '-pub_date')
@@ -0,0 +1,168 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import (
+    bump_versions, cards_namespace, group_namespace, groups_namespace,
+    index_namespace, post_namespace, post_namespaces, profile_namespace,
+)
+from .counters import change_counter, change_user_counter
+from .feed import backfill_feed, fan_out_post, prune_feed, unfan_post
+from .models import Comment, Follow, Group, Post, User, UserCounters
+from .search import index_post, unindex_post
+
+# Поля пользователя, которые выводятся в карточках его постов.
+USER_CARD_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def user_pre_save(sender, instance, update_fields, **kwargs):
+    """Запоминает прежнее имя пользователя перед сохранением."""
+    instance._previous_card = None
+    if instance.pk is None or (
+        update_fields and set(update_fields) <= {'last_login'}
+    ):
+        return
+    instance._previous_card = User.objects.filter(
+        pk=instance.pk,
+    ).values_list(*USER_CARD_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    """Создает строку счетчиков для нового пользователя и сбрасывает
+    кеш его профиля (на странице выводится полное имя)."""
+    if created:
+        UserCounters.objects.get_or_create(user=instance)
+    # Вход меняет только last_login, которого нет на страницах.
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    namespaces = [profile_namespace(instance.get_username())]
+    previous = getattr(instance, '_previous_card', None)
+    card = tuple(getattr(instance, field) for field in USER_CARD_FIELDS)
+    if previous is not None and previous != card:
+        # Имя выводится в карточках постов на всех страницах, где
+        # они встречаются, а не только в профиле.
+        namespaces += [
+            profile_namespace(previous[0]), index_namespace(),
+            cards_namespace(),
+        ]
+    bump_versions(namespaces)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    bump_versions([profile_namespace(instance.get_username())])
+
+
+@receiver(pre_save, sender=Post)
+def post_pre_save(sender, instance, **kwargs):
+    """Запоминает прежнюю группу поста перед редактированием."""
+    instance._previous_group_id = None
+    instance._previous_group_slug = None
+    if instance.pk is not None:
+        previous = Post.objects.filter(
+            pk=instance.pk,
+        ).values_list('group_id', 'group__slug').first()
+        if previous is not None:
+            (instance._previous_group_id,
+             instance._previous_group_slug) = previous
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    """Обновляет счетчики, ленты подписчиков, поисковый индекс
+    и версии кеша страниц."""
+    with transaction.atomic():
+        index_post(instance)
+        if created:
+            change_user_counter(instance.author_id, 'posts_count', 1)
+            change_counter(Group, instance.group_id, 'posts_count', 1)
+            fan_out_post(instance)
+        elif instance._previous_group_id != instance.group_id:
+            change_counter(
+                Group, instance._previous_group_id, 'posts_count', -1
+            )
+            change_counter(Group, instance.group_id, 'posts_count', 1)
+    namespaces = post_namespaces(instance)
+    if not created and instance._previous_group_slug is not None:
+        namespaces.append(group_namespace(instance._previous_group_slug))
+    bump_versions(namespaces)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    with transaction.atomic():
+        unindex_post(instance.pk)
+        change_user_counter(instance.author_id, 'posts_count', -1)
+        change_counter(Group, instance.group_id, 'posts_count', -1)
+        unfan_post(instance)
+    bump_versions(post_namespaces(instance))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Post, instance.post_id, 'comments_count', 1)
+    bump_versions([post_namespace(instance.post_id)])
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    change_counter(Post, instance.post_id, 'comments_count', -1)
+    bump_versions([post_namespace(instance.post_id)])
+
+
+def _follow_namespaces(follow):
+    # Счетчики подписок выводятся в профилях обоих пользователей.
+    return [
+        profile_namespace(follow.author.get_username()),
+        profile_namespace(follow.user.get_username()),
+    ]
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    """Обновляет счетчики и заполняет ленту постами автора."""
+    if not created:
+        return
+    with transaction.atomic():
+        change_user_counter(instance.user_id, 'following_count', 1)
+        change_user_counter(instance.author_id, 'followers_count', 1)
+        backfill_feed(instance.user_id, instance.author_id)
+    bump_versions(_follow_namespaces(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """Обновляет счетчики и очищает ленту от постов автора."""
+    with transaction.atomic():
+        change_user_counter(instance.user_id, 'following_count', -1)
+        change_user_counter(instance.author_id, 'followers_count', -1)
+        prune_feed(instance.user_id, instance.author_id)
+    bump_versions(_follow_namespaces(instance))
+
+
+@receiver(pre_save, sender=Group)
+def group_pre_save(sender, instance, **kwargs):
+    """Запоминает прежний slug группы перед переименованием."""
+    instance._previous_slug = None
+    if instance.pk is not None:
+        instance._previous_slug = Group.objects.filter(
+            pk=instance.pk,
+        ).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    """Сбрасывает кеш страниц с названием группы, в том числе
+    карточек ее постов на главной, в профилях и на страницах постов."""
+    namespaces = [
+        groups_namespace(), group_namespace(instance.slug),
+        index_namespace(), cards_namespace(),
+    ]
+    previous_slug = getattr(instance, '_previous_slug', None)
+    if previous_slug not in (None, instance.slug):
+        namespaces.append(group_namespace(previous_slug))
+    bump_versions(namespaces)
@@ -0,0 +1,11 @@
+from django import template
+
+from ..feed import get_request_feed_unread
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def feed_unread(context):
+    """Число новых постов в ленте подписок текущего пользователя."""
+    return get_request_feed_unread(context['request'])
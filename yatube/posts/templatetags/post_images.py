@@ -0,0 +1,20 @@
+from django import template
+
+from ..thumbnails import get_ready_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def ready_thumbnail(context, image, alias):
+    """Готовая миниатюра картинки или None, если она еще создается.
+
+    Если view заранее загрузила миниатюры страницы в ``thumbnails``,
+    берет миниатюру оттуда без обращения к key-value store.
+    """
+    if not image:
+        return None
+    prefetched = context.get('thumbnails')
+    if prefetched is not None:
+        return prefetched.get((image.name, alias))
+    return get_ready_thumbnail(image, alias)
@@ -1,13 +1,21 @@
 import shutil
 import tempfile
+from io import StringIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 
+from .. import thumbnails
 from ..models import Post, Group
+from ..thumbnails import (
+    get_ready_thumbnail, get_ready_thumbnails, schedule_thumbnails,
+)
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -47,6 +55,7 @@ class PostFormTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(user=self.user)
 
@@ -110,6 +119,98 @@ class PostFormTests(TestCase):
             ).exists()
         )
 
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_thumbnails_pregenerated(self):
+        """Миниатюра не создается при рендеринге, а ставится в очередь
+        при промахе."""
+        post = Post.objects.create(
+            text='TestText',
+            author=self.user,
+            image=SimpleUploadedFile(
+                name='ThumbImage.gif',
+                content=self.raw_image,
+                content_type='image/gif',
+            ),
+        )
+        self.assertIsNone(get_ready_thumbnail(post.image, 'card'))
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertNotContains(response, 'card-img my-2" src=')
+        self.assertIsNotNone(get_ready_thumbnail(post.image, 'card'))
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_thumbnails_prefetched_for_page(self):
+        """Миниатюры страницы ищутся одним пакетом."""
+        posts = [
+            Post.objects.create(
+                text=f'TestText{number}',
+                author=self.user,
+                image=SimpleUploadedFile(
+                    name=f'PageImage{number}.gif',
+                    content=self.raw_image,
+                    content_type='image/gif',
+                ),
+            )
+            for number in range(3)
+        ]
+        schedule_thumbnails(posts[0].image.name)
+        thumbnails = get_ready_thumbnails(
+            [post.image for post in posts], ('card',)
+        )
+        self.assertEqual(list(thumbnails), [(posts[0].image.name, 'card')])
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(
+            response.context['thumbnails'].keys(), thumbnails.keys()
+        )
+        self.assertContains(response, 'card-img my-2" src=', count=1)
+        # Промахи страницы поставили создание остальных миниатюр.
+        self.assertEqual(
+            len(get_ready_thumbnails([post.image for post in posts],
+                                     ('card',))),
+            len(posts),
+        )
+        out = StringIO()
+        call_command('bench_thumbnails', repeat=1, stdout=out)
+        self.assertIn('экономит', out.getvalue())
+
+    def test_backfill_thumbnails(self):
+        """Команда создает миниатюры постов, сохраненных в обход view."""
+        post = Post.objects.create(
+            text='TestText',
+            author=self.user,
+            image=SimpleUploadedFile(
+                name='BackfillImage.gif',
+                content=self.raw_image,
+                content_type='image/gif',
+            ),
+        )
+        missing = Post.objects.create(
+            text='TestText', author=self.user, image='posts/Missing.gif',
+        )
+        out, err = StringIO(), StringIO()
+        with self.assertLogs(level='WARNING'):
+            call_command('backfill_thumbnails', stdout=out, stderr=err)
+        self.assertIn(
+            'Созданы миниатюры для картинок: 1, ошибок: 1', out.getvalue(),
+        )
+        self.assertIn(f'Пост {missing.pk}', err.getvalue())
+        self.assertIsNotNone(get_ready_thumbnail(post.image, 'card'))
+        self.assertIsNone(get_ready_thumbnail(missing.image, 'card'))
+
+    def test_worker_keeps_inherited_connection_open(self):
+        """Процесс пула не закрывает соединение родительского процесса."""
+        Post.objects.exists()
+        inherited = connection.connection
+        try:
+            thumbnails._init_worker()
+            self.assertIsNone(connection.connection)
+            self.assertIn(inherited, thumbnails._inherited_connections)
+            inherited.cursor().execute('SELECT 1')
+        finally:
+            connection.connection = inherited
+            thumbnails._inherited_connections.clear()
+
 
 class CommentFormTest(TestCase):
     """Тестирование формы CommentForm."""
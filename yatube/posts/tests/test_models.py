@@ -1,10 +1,18 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
 from unittest import skipUnless
 
 from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
 from django.test import TestCase
 from django.conf import settings
+from django.db import connection
 
-from ..models import Post, Group
+from ..models import Post, Group, Comment, Follow, FeedEntry, UserCounters
+from ..search import search_posts
 
 User = get_user_model()
 
@@ -152,4 +160,213 @@ class GroupModelTests(TestCase):
             expected_value,
             (f'Значение "unique" для поля "{field}" '
              f'должно быть равно "{expected_value}".')
-        )
\ No newline at end of file
+        )
+
+
+class CountersTests(TestCase):
+    """Тестирование денормализованных счетчиков."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.group = Group.objects.create(
+            title='TestTitle',
+            slug='test_slug',
+            description='TestDescription',
+        )
+        cls.other_group = Group.objects.create(
+            title='TestTitleOther',
+            slug='test_slug_other',
+            description='TestDescriptionOther',
+        )
+
+    def _counters(self, user):
+        return UserCounters.objects.get(user=user)
+
+    def test_post_counters(self):
+        """Создание, перенос и удаление поста меняют счетчики."""
+        post = Post.objects.create(
+            author=self.user,
+            text='Test',
+            group=self.group,
+        )
+        self.assertEqual(self._counters(self.user).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+
+        post.group = self.other_group
+        post.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+
+        post.delete()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self._counters(self.user).posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 0)
+
+    def test_comment_counter(self):
+        """Комментарии меняют счетчик поста."""
+        post = Post.objects.create(author=self.user, text='Test')
+        comment = Comment.objects.create(
+            post=post,
+            author=self.follower,
+            text='Comment',
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка меняет счетчики подписчиков и подписок."""
+        follow = Follow.objects.create(user=self.follower, author=self.user)
+        self.assertEqual(self._counters(self.user).followers_count, 1)
+        self.assertEqual(self._counters(self.follower).following_count, 1)
+        follow.delete()
+        self.assertEqual(self._counters(self.user).followers_count, 0)
+        self.assertEqual(self._counters(self.follower).following_count, 0)
+
+    def test_recount_counters_command(self):
+        """Команда recount_counters исправляет рассинхронизацию."""
+        Post.objects.create(author=self.user, text='Test', group=self.group)
+        UserCounters.objects.filter(user=self.user).update(posts_count=10)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=10)
+        call_command('recount_counters', stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertEqual(self._counters(self.user).posts_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+
+
+class ImportArchiveTests(TestCase):
+    """Тестирование команды потокового импорта import_archive."""
+
+    records = [
+        {'type': 'user', 'username': 'writer', 'first_name': 'Writer'},
+        {'type': 'user', 'username': 'reader'},
+        {'type': 'group', 'slug': 'cats', 'title': 'Cats'},
+        {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+        {'type': 'post', 'id': 100, 'author': 'writer', 'group': 'cats',
+         'text': 'Про котиков', 'pub_date': '2015-05-01T10:00:00'},
+        {'type': 'post', 'id': 101, 'author': 'writer',
+         'text': 'Про собак', 'pub_date': '2016-05-01T10:00:00+00:00'},
+        {'type': 'comment', 'id': 200, 'post': 100, 'author': 'reader',
+         'text': 'Отлично', 'created': '2015-05-02T10:00:00'},
+        {'type': 'comment', 'id': 201, 'post': 101, 'author': 'ghost',
+         'text': 'Тоже отлично'},
+    ]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'archive.jsonl')
+        self.checkpoint = f'{self.path}.checkpoint'
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_import_resumes_after_failure(self):
+        """Импорт продолжается с контрольной точки без дубликатов."""
+        self._write(self.records)
+        with self.assertRaises(CommandError):
+            self._import()
+        self.assertTrue(os.path.exists(self.checkpoint))
+        self.assertEqual(Post.objects.count(), 2)
+
+        fixed = [dict(record) for record in self.records]
+        fixed[-1]['author'] = 'writer'
+        self._write(fixed)
+        out = self._import('--resume')
+
+        self.assertIn('записей/с', out)
+        self.assertFalse(os.path.exists(self.checkpoint))
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 2)
+        post = Post.objects.get(pk=100)
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.group.slug, 'cats')
+        self.assertEqual(post.comments_count, 1)
+        writer = User.objects.get(username='writer')
+        self.assertEqual(writer.get_full_name(), 'Writer')
+        self.assertEqual(writer.counters.posts_count, 2)
+        self.assertEqual(writer.counters.followers_count, 1)
+        self.assertEqual(
+            FeedEntry.objects.filter(user__username='reader').count(), 2
+        )
+        if connection.vendor == 'sqlite':
+            self.assertEqual(
+                list(search_posts(Post.objects, 'котиков')), [post]
+            )
+
+    def test_taken_post_id_fails(self):
+        """Пост архива с id чужого поста не теряется молча."""
+        author = User.objects.create_user(username='local')
+        Post.objects.create(id=100, author=author, text='Местный пост')
+        self._write(self.records[:-1])
+        with self.assertRaisesMessage(CommandError, 'id 100'):
+            self._import()
+        self.assertFalse(Comment.objects.filter(post_id=100).exists())
+        self.assertEqual(Post.objects.get(pk=100).text, 'Местный пост')
+
+    def test_reimport_reports_skipped(self):
+        """Повторный импорт ничего не дублирует и сообщает о пропусках."""
+        self._write(self.records[:-1])
+        self._import()
+        out = self._import()
+        self.assertIn('Пропущено уже существующих', out)
+        self.assertIn('постов 2', out)
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_bad_records_report_line(self):
+        """Битая строка и неверные поля дают ошибку с номером строки."""
+        users = [json.dumps(record) for record in self.records[:2]]
+        bad_lines = {
+            '{"type": "post", "author": "writer"': 'некорректный JSON',
+            json.dumps({'type': 'post', 'author': 'writer'}):
+                'нет полей text',
+            json.dumps({'type': 'post', 'id': 'x', 'author': 'writer',
+                        'text': 'Текст'}): 'некорректное значение',
+            json.dumps({'type': 'comment', 'post': 100, 'author': 'writer',
+                        'text': 'Текст', 'created': '2015-13-01T10:00'}):
+                'некорректное значение',
+            '[1, 2]': 'запись должна быть объектом',
+        }
+        for bad_line, message in bad_lines.items():
+            with self.subTest(bad_line=bad_line):
+                with open(self.path, 'w', encoding='utf-8') as file:
+                    file.write('\n'.join(users + ['', bad_line]) + '\n')
+                with self.assertRaises(CommandError) as raised:
+                    self._import()
+                self.assertIn(f'Строка 4: {message}', str(raised.exception))
+
+    def test_import_csv(self):
+        path = os.path.join(self.directory, 'archive.csv')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(
+                'type,username,author,text\n'
+                'user,writer,,\n'
+                'post,,writer,Текст из CSV\n'
+            )
+        call_command('import_archive', path, stdout=StringIO())
+        self.assertTrue(
+            Post.objects.filter(
+                author__username='writer', text='Текст из CSV',
+            ).exists()
+        )
+
+    def _write(self, records):
+        with open(self.path, 'w', encoding='utf-8') as file:
+            for record in records:
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def _import(self, *args):
+        out = StringIO()
+        call_command(
+            'import_archive', self.path, '--batch-size', '2', *args,
+            stdout=out,
+        )
+        return out.getvalue()
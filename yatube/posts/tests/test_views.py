@@ -1,16 +1,39 @@
+import base64
+import json
+import os
 import shutil
 import tempfile
+from io import StringIO
+from unittest import mock, skipUnless
 
 from django import forms
 from django.conf import settings
+from django.contrib.admin.widgets import AutocompleteSelect
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client, override_settings
-from django.urls import reverse
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import (
+    TestCase, TransactionTestCase, Client, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
 
+from core.testing import execute_on_commit
+
+from ..cache import (
+    cards_namespace, get_versions, index_namespace, post_namespace,
+    profile_namespace,
+)
+from ..feed import get_feed_unread
 from ..forms import PostForm
-from ..models import Post, Group, Follow
+from ..management.commands.loadbench import named_urls
+from ..models import Post, Group, Follow, FeedEntry, Comment
+from ..paginators import (
+    CursorPaginator, EstimatedCountPaginator, WindowedPaginator,
+)
+from ..search import search_posts
 
 EXPECTED_POST_FORM_FIELDS = {
     'text': forms.CharField,
@@ -20,6 +43,9 @@ EXPECTED_POST_FORM_FIELDS = {
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
+INDEXED_TABLES = ('posts_post', 'posts_comment', 'posts_follow',
+                  'posts_feedentry')
+
 User = get_user_model()
 
 
@@ -267,6 +293,117 @@ class PaginatorViewsTest(TestCase):
             with self.subTest(view=view):
                 self._pagination_testing(url)
 
+    def test_page_window(self):
+        """Пагинатор выводит только окно номеров вокруг текущей страницы."""
+        queryset = Post.objects.all()
+        paginator = WindowedPaginator(queryset, 1, count=len(self.posts))
+        self.assertEqual(list(paginator.page(1).page_window), [1, 2, 3, 4])
+        self.assertEqual(
+            list(paginator.page(10).page_window), list(range(7, 14)),
+        )
+        self.assertEqual(
+            list(paginator.page(len(self.posts)).page_window),
+            list(range(len(self.posts) - 3, len(self.posts) + 1)),
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.num_pages, len(self.posts))
+        self.assertEqual(len(queries), 0)
+
+    def test_page_count_is_cached(self):
+        """Число постов считается один раз до следующей записи."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.authorized_client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url, {'page': 2})
+        self.assertFalse(
+            [query for query in queries if 'COUNT(' in query['sql']]
+        )
+        self.assertEqual(
+            response.context['page_obj'].paginator.count, len(self.posts),
+        )
+        with execute_on_commit():
+            Post.objects.create(
+                text='NewText', author=self.user, group=self.group,
+            )
+        response = self.authorized_client.get(url, {'page': 3})
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+    def test_bench_paginator_command(self):
+        out = StringIO()
+        call_command(
+            'bench_paginator', group=self.group.slug, repeat=1, stdout=out,
+        )
+        self.assertIn('оконный', out.getvalue())
+
+    def test_cursor_pagination(self):
+        """Проверяет keyset-пагинацию по курсорам ?before=/?after=."""
+        url = reverse(
+            'posts:group_list',
+            kwargs={'slug': self.group.slug}
+        )
+        first_page = self.authorized_client.get(url + '?before=')
+        page_obj = first_page.context.get('page_obj')
+        self.assertEqual(len(page_obj), settings.POSTS_PER_PAGE)
+        self.assertFalse(page_obj.has_previous())
+        self.assertTrue(page_obj.has_next())
+
+        second_page = self.authorized_client.get(
+            url, {'before': page_obj.next_cursor}
+        )
+        second_page_obj = second_page.context.get('page_obj')
+        self.assertEqual(len(second_page_obj), settings.POSTS_PER_PAGE)
+        self.assertFalse(second_page_obj.has_next())
+        self.assertFalse(set(page_obj) & set(second_page_obj))
+        # Ссылка на первую страницу не выключает режим курсоров.
+        self.assertContains(second_page, 'href="?before="')
+
+        previous_page = self.authorized_client.get(
+            url, {'after': second_page_obj.previous_cursor}
+        )
+        self.assertEqual(
+            list(previous_page.context.get('page_obj')),
+            list(page_obj),
+        )
+
+    def test_invalid_cursor(self):
+        """Некорректный курсор приводит к 404."""
+        response = self.authorized_client.get(
+            reverse('posts:index'), {'before': 'invalid'}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_malformed_cursor_values(self):
+        """Курсор, который декодируется, но содержит невозможные
+        значения, тоже приводит к 404, а не к ошибке сервера."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse(
+                'posts:profile',
+                kwargs={'username': self.user.get_username()},
+            ),
+            reverse('posts:follow_index'),
+        )
+        cursors = {
+            'bad_date': ['2020-13-45T10:00:00+00:00', 1],
+            'naive_date': ['2020-01-01T10:00:00', 1],
+            'date_number': [5, 1],
+            'bad_id': ['2020-01-01T10:00:00+00:00', 'abc'],
+            'null_id': ['2020-01-01T10:00:00+00:00', None],
+            'list_id': ['2020-01-01T10:00:00+00:00', [1]],
+        }
+        for url in urls:
+            for name, values in cursors.items():
+                cursor = base64.urlsafe_b64encode(
+                    json.dumps(values).encode()
+                ).decode()
+                for param in ('before', 'after'):
+                    with self.subTest(url=url, cursor=name, param=param):
+                        response = self.authorized_client.get(
+                            url, {param: cursor},
+                        )
+                        self.assertEqual(response.status_code, 404)
+
     def _pagination_testing(self, url):
         first_page_response = self.authorized_client.get(url)
         second_page_response = self.authorized_client.get(url + '?page=2')
@@ -299,9 +436,10 @@ class CacheViewsTests(TestCase):
         cache.clear()
 
     def test_cache_index_page(self):
+        """Страница кешируется, пока данные не меняются."""
         url = self.URLS['index_page']
         response = self._get_response(url)
-        self.post.delete()
+        Post.objects.filter(pk=self.post.pk).update(text='ChangedText')
         self.assertEqual(
             self._get_response(url).content,
             response.content,
@@ -312,10 +450,208 @@ class CacheViewsTests(TestCase):
             response.content,
         )
 
+    def test_cache_invalidated_on_write(self):
+        """Изменение поста сразу сбрасывает кеш страниц."""
+        urls = (
+            self.URLS['index_page'],
+            reverse(
+                'posts:profile',
+                kwargs={'username': self.user.get_username()},
+            ),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self._get_response(url)
+                self.post.text = f'{self.post.text}Edited'
+                with execute_on_commit():
+                    self.post.save()
+                self.assertNotEqual(
+                    self._get_response(url).content,
+                    response.content,
+                )
+
+    def test_cache_invalidated_on_delete(self):
+        """Удаленный пост сразу пропадает с главной страницы."""
+        post = Post.objects.create(text='DeletedText', author=self.user)
+        url = self.URLS['index_page']
+        response = self._get_response(url)
+        with execute_on_commit():
+            post.delete()
+        self.assertNotEqual(
+            self._get_response(url).content,
+            response.content,
+        )
+
+    def test_cache_invalidated_on_rename(self):
+        """Новое название группы и имя автора сразу видны в карточках."""
+        group = Group.objects.create(
+            title='TestTitle',
+            slug='test_slug',
+            description='TestDescription',
+        )
+        post = Post.objects.create(
+            text='GroupText', author=self.user, group=group,
+        )
+        urls = (
+            self.URLS['index_page'],
+            reverse('posts:index_rss'),
+            reverse(
+                'posts:profile',
+                kwargs={'username': self.user.get_username()},
+            ),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        )
+        for url in urls:
+            self._get_response(url)
+        group.title = 'RenamedTitle'
+        with execute_on_commit():
+            group.save()
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = 'Renamed'
+        author.last_name = 'Author'
+        with execute_on_commit():
+            author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self._get_response(url)
+                self.assertContains(response, 'RenamedTitle')
+                self.assertContains(response, 'Renamed Author')
+
+    def test_password_change_keeps_cards(self):
+        """Сохранение пользователя без смены имени не сбрасывает карточки."""
+        versions = get_versions([cards_namespace()])
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new-password')
+        with execute_on_commit():
+            user.save()
+        self.assertEqual(get_versions([cards_namespace()]), versions)
+
+    def test_cached_page_is_personalized(self):
+        """Общая оболочка страницы дополняется фрагментами пользователя."""
+        url = self.URLS['index_page']
+        self._get_response(url)
+        Post.objects.filter(pk=self.post.pk).update(text='ChangedText')
+        authorized_client = Client()
+        authorized_client.force_login(self.user)
+        response = authorized_client.get(url)
+        self.assertContains(response, 'TestText')
+        self.assertContains(response, 'Новая запись')
+        self.assertContains(response, self.user.get_username())
+        self.assertNotContains(self._get_response(url), 'Новая запись')
+
+    def test_conditional_get(self):
+        """Неизменившаяся страница отдается как 304 без запросов данных."""
+        group = Group.objects.create(
+            title='TestTitle',
+            slug='test_slug',
+            description='TestDescription',
+        )
+        urls = (
+            self.URLS['index_page'],
+            reverse('posts:group_list', kwargs={'slug': group.slug}),
+            reverse(
+                'posts:profile',
+                kwargs={'username': self.user.get_username()},
+            ),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                etag = self._get_response(url)['ETag']
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=etag,
+                    )
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(response.templates)
+                self.assertFalse(any(
+                    'COUNT' in query['sql']
+                    for query in queries.captured_queries
+                ))
+                with execute_on_commit():
+                    Post.objects.create(
+                        text='NewText', author=self.user, group=group,
+                    )
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_post_detail_conditional_get_without_queries(self):
+        """Условный GET страницы поста не обращается к БД."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        guest_client = Client()
+        etag = guest_client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_depends_on_user(self):
+        url = self.URLS['index_page']
+        etag = self._get_response(url)['ETag']
+        authorized_client = Client()
+        authorized_client.force_login(self.user)
+        response = authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
     def _get_response(self, url):
         return self.client.get(url)
 
 
+class CacheCommitTests(TransactionTestCase):
+    """Версии кеша меняются только после коммита транзакции."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_versions_bumped_after_commit(self):
+        user = User.objects.create_user(username='TestUser')
+        author = User.objects.create_user(username='TestAuthor')
+        namespaces = [
+            index_namespace(),
+            profile_namespace(user.get_username()),
+            profile_namespace(author.get_username()),
+        ]
+        versions = get_versions(namespaces)
+        with transaction.atomic():
+            post = Post.objects.create(text='TestText', author=user)
+            Comment.objects.create(post=post, author=author, text='Comment')
+            Follow.objects.create(user=user, author=author)
+            # Параллельный запрос закешировал бы здесь старые данные
+            # под новой версией.
+            self.assertEqual(get_versions(namespaces), versions)
+            post_versions = get_versions([post_namespace(post.pk)])
+        for namespace, before, after in zip(
+            namespaces, versions, get_versions(namespaces),
+        ):
+            with self.subTest(namespace=namespace):
+                self.assertNotEqual(after, before)
+        self.assertNotEqual(
+            get_versions([post_namespace(post.pk)]), post_versions,
+        )
+
+    def test_rolled_back_write_keeps_versions(self):
+        user = User.objects.create_user(username='TestUser')
+        versions = get_versions([index_namespace()])
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Post.objects.create(text='TestText', author=user)
+            raise RuntimeError
+        self.assertEqual(get_versions([index_namespace()]), versions)
+
+    def test_login_keeps_profile_version(self):
+        """Вход меняет только last_login и не сбрасывает кеш профиля."""
+        user = User.objects.create_user(username='TestUser', password='pass')
+        namespaces = [profile_namespace(user.get_username())]
+        versions = get_versions(namespaces)
+        self.assertTrue(
+            self.client.login(username='TestUser', password='pass')
+        )
+        self.assertEqual(get_versions(namespaces), versions)
+        user.first_name = 'Test'
+        user.save()
+        self.assertNotEqual(get_versions(namespaces), versions)
+
+
 class FollowViewsTests(TestCase):
     """Тест подписки на авторов."""
 
@@ -381,4 +717,762 @@ class FollowViewsTests(TestCase):
     def test_post_not_in_follow_page(self):
         """Пост не появляется на странице /posts/follow/"""
         response = self.client.get(reverse('posts:follow_index'))
-        self.assertNotIn(self.post, response.context.get('page_obj'))
\ No newline at end of file
+        self.assertNotIn(self.post, response.context.get('page_obj'))
+
+    def test_new_post_fan_out_to_followers(self):
+        """Новый пост автора попадает в ленту подписчика."""
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_author,
+        )
+        new_post = Post.objects.create(
+            text='NewTestText',
+            author=self.user_author,
+        )
+        response = self.client_follower.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context.get('page_obj')[0], new_post)
+
+    def test_unfollowing_prunes_feed(self):
+        """После отписки посты автора удаляются из ленты."""
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_author,
+        )
+        self.client_follower.get(
+            reverse(
+                'posts:profile_unfollow',
+                kwargs={'username': self.user_author.get_username()}
+            ),
+        )
+        self.assertFalse(
+            FeedEntry.objects.filter(user=self.user_follower).exists()
+        )
+
+    @override_settings(FEED_MAX_ENTRIES=2)
+    def test_feed_is_trimmed(self):
+        """Лента подписок не превышает FEED_MAX_ENTRIES записей."""
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_author,
+        )
+        new_posts = [
+            Post.objects.create(text='NewTestText', author=self.user_author)
+            for _ in range(3)
+        ]
+        feed_posts = Post.objects.filter(
+            feed_entries__user=self.user_follower,
+        )
+        self.assertEqual(list(feed_posts), new_posts[:0:-1])
+
+    def test_unread_badge(self):
+        """Вкладка подписок показывает число новых постов до просмотра."""
+        cache.clear()
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_author,
+        )
+        self.client_follower.get(reverse('posts:follow_index'))
+        with execute_on_commit():
+            new_posts = [
+                Post.objects.create(
+                    text='NewTestText', author=self.user_author,
+                )
+                for _ in range(3)
+            ]
+            new_posts[0].delete()
+        self.assertEqual(get_feed_unread(self.user_follower.pk), 2)
+        response = self.client_follower.get(reverse('posts:index'))
+        self.assertContains(response, 'title="Новые посты"')
+        self.client_follower.get(reverse('posts:follow_index'))
+        # Счетчик входит в ETag: браузер не покажет старый бейдж по 304.
+        not_modified = self.client_follower.get(
+            reverse('posts:index'), HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(not_modified.status_code, 200)
+        self.assertNotContains(not_modified, 'title="Новые посты"')
+        self.assertEqual(get_feed_unread(self.user_follower.pk), 0)
+
+    def test_unread_count_is_cached(self):
+        """Счетчик читается из кеша без запросов к БД."""
+        cache.clear()
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_author,
+        )
+        unread = get_feed_unread(self.user_follower.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(get_feed_unread(self.user_follower.pk), unread)
+        self.assertEqual(len(queries), 0)
+        with execute_on_commit():
+            Post.objects.create(text='NewTestText', author=self.user_author)
+        self.assertEqual(get_feed_unread(self.user_follower.pk), unread + 1)
+        with execute_on_commit():
+            Follow.objects.filter(user=self.user_follower).delete()
+        self.assertEqual(get_feed_unread(self.user_follower.pk), 0)
+
+    def test_unread_count_read_once_per_request(self):
+        """ETag, вкладки и лента подписок читают счетчик один раз."""
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_author,
+        )
+        with execute_on_commit():
+            Post.objects.create(text='NewTestText', author=self.user_author)
+        for url in (reverse('posts:index'), reverse('posts:follow_index')):
+            with self.subTest(url=url):
+                with mock.patch(
+                    'posts.feed.get_feed_unread', wraps=get_feed_unread,
+                ) as spy:
+                    response = self.client_follower.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(spy.call_count, 1)
+        # Просмотр ленты сразу убирает бейдж с ее же вкладки.
+        self.assertNotContains(response, 'title="Новые посты"')
+
+
+class QueryBudgetTests(TestCase):
+    """Число запросов страниц не превышает ``query_budget`` их view.
+
+    Бюджет считается для авторизованного пользователя с пустым кешем,
+    поэтому в него входят запросы сессии и пользователя.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.authors = [
+            User.objects.create_user(username=f'TestAuthor{number}')
+            for number in range(3)
+        ]
+        cls.groups = [
+            Group.objects.create(
+                title=f'TestTitle{number}',
+                slug=f'test_slug_{number}',
+                description='TestDescription',
+            )
+            for number in range(3)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.user, author=author)
+        cls.posts = [
+            Post.objects.create(
+                text=f'TestText {number}',
+                author=cls.authors[number % 3],
+                group=cls.groups[number % 3],
+            )
+            for number in range(settings.POSTS_PER_PAGE * 2)
+        ]
+        cls.post = cls.posts[-1]
+        for author in cls.authors:
+            Comment.objects.create(post=cls.post, author=author, text='Test')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.client_author = Client()
+        self.client_author.force_login(self.post.author)
+
+    def _assert_within_budget(self, client, url):
+        match = resolve(url.split('?')[0])
+        view = getattr(match.func, 'view_class', match.func)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries), view.query_budget,
+            '\n'.join(query['sql'] for query in queries),
+        )
+
+    def test_views_within_query_budget(self):
+        post_id = {'post_id': self.post.pk}
+        slug = {'slug': self.post.group.slug}
+        username = {'username': self.post.author.get_username()}
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:index') + '?page=2',
+            reverse('posts:index') + '?before=',
+            reverse('posts:group_list', kwargs=slug),
+            reverse('posts:profile', kwargs=username),
+            reverse('posts:post_detail', kwargs=post_id),
+            reverse('posts:comments', kwargs=post_id),
+            reverse('posts:search') + '?q=TestText',
+            reverse('posts:follow_index'),
+            reverse('posts:post_create'),
+            reverse('posts:index_rss'),
+            reverse('posts:group_atom', kwargs=slug),
+            reverse('posts:profile_rss', kwargs=username),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self._assert_within_budget(self.client, url)
+        author_urls = (
+            reverse('posts:post_edit', kwargs=post_id),
+            reverse('posts:profile_export', kwargs=username),
+        )
+        for url in author_urls:
+            with self.subTest(url=url):
+                self._assert_within_budget(self.client_author, url)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть в SQLite')
+class QueryPlanTests(TestCase):
+    """Запросы страниц постов используют индексы (EXPLAIN QUERY PLAN)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.group = Group.objects.create(
+            title='TestTitle',
+            slug='test_slug',
+            description='TestDescription',
+        )
+        cls.post = Post.objects.create(
+            text='TestText',
+            author=cls.author,
+            group=cls.group,
+        )
+        Comment.objects.create(post=cls.post, author=cls.user, text='Test')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def test_views_use_indexes(self):
+        """Ни один запрос страниц не сканирует таблицы целиком, а списки
+        с пагинацией еще и не сортируются во временном B-дереве."""
+        paginated_urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse(
+                'posts:profile',
+                kwargs={'username': self.author.get_username()},
+            ),
+            reverse('posts:follow_index'),
+            reverse('posts:comments', kwargs={'post_id': self.post.pk}),
+        )
+        other_urls = (
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:search') + '?q=TestText',
+        )
+        for url in paginated_urls + other_urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                for query in queries.captured_queries:
+                    self._assert_no_full_scan(
+                        query['sql'], sorted_in_index=url in paginated_urls,
+                    )
+
+    def test_cursor_pages_read_index_range(self):
+        """Страница после курсора читается диапазоном индекса без
+        сортировки во временном B-дереве."""
+        cursor = CursorPaginator(Post.objects.all(), 10).encode_cursor(
+            self.post,
+        )
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse(
+                'posts:profile',
+                kwargs={'username': self.author.get_username()},
+            ),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            for param in ('before', 'after'):
+                with self.subTest(url=url, param=param):
+                    cache.clear()
+                    with CaptureQueriesContext(connection) as queries:
+                        self.client.get(url, {param: cursor})
+                    plans = [
+                        self._plan(query['sql'])
+                        for query in queries.captured_queries
+                        if 'pub_date" <' in query['sql']
+                        or 'pub_date" >' in query['sql']
+                    ]
+                    self.assertTrue(plans)
+                    for plan in plans:
+                        self.assertFalse(
+                            [step for step in plan if any(
+                                word in step
+                                for word in ('TEMP B-TREE', 'MULTI-INDEX')
+                            )],
+                            plan,
+                        )
+
+    def _plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def _assert_no_full_scan(self, sql, sorted_in_index=False):
+        if not sql.startswith('SELECT'):
+            return
+        for step in self._plan(sql):
+            words = step.replace('SCAN TABLE', 'SCAN').split()
+            self.assertFalse(
+                words[:1] == ['SCAN']
+                and words[1] in INDEXED_TABLES
+                and len(words) == 2,
+                f'Полный скан таблицы: {step}\n{sql}',
+            )
+            if sorted_in_index:
+                self.assertNotIn(
+                    'USE TEMP B-TREE', step,
+                    f'Сортировка во временном B-дереве: {step}\n{sql}',
+                )
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Индекс FTS5 есть только в SQLite')
+class SearchViewsTests(TestCase):
+    """Полнотекстовый поиск по постам."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_superuser(
+            username='TestUser', email='test@test.ru', password='password',
+        )
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.group = Group.objects.create(
+            title='TestTitle',
+            slug='test_slug',
+            description='TestDescription',
+        )
+        cls.rare_post = Post.objects.create(
+            text='Котики и собаки',
+            author=cls.user,
+        )
+        cls.frequent_post = Post.objects.create(
+            text='Котики, котики и еще раз котики',
+            author=cls.author,
+            group=cls.group,
+        )
+        Post.objects.create(text='Про погоду', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_search_ranks_results(self):
+        """Найденные посты упорядочены по релевантности."""
+        response = self.client.get(reverse('posts:search'), {'q': 'КОТИКИ'})
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [self.frequent_post, self.rare_post],
+        )
+
+    def test_search_filters(self):
+        """Поиск фильтруется по сообществу и автору."""
+        filters = (
+            {'group': self.group.slug},
+            {'author': self.author.get_username()},
+        )
+        for params in filters:
+            with self.subTest(params=params):
+                response = self.client.get(
+                    reverse('posts:search'), {'q': 'кот', **params},
+                )
+                self.assertEqual(
+                    list(response.context['page_obj']), [self.frequent_post],
+                )
+
+    def test_search_index_follows_changes(self):
+        """Индекс обновляется при редактировании и удалении поста."""
+        post = Post.objects.create(text='Слон', author=self.author)
+        self.assertEqual(list(search_posts(Post.objects, 'слон')), [post])
+        post.text = 'Жираф'
+        post.save()
+        self.assertFalse(search_posts(Post.objects, 'слон').exists())
+        self.assertEqual(list(search_posts(Post.objects, 'жираф')), [post])
+        post.delete()
+        self.assertFalse(search_posts(Post.objects, 'жираф').exists())
+
+    def test_search_query_syntax_is_escaped(self):
+        """Синтаксис FTS5 во вводе пользователя не вызывает ошибок."""
+        for query in ('"', 'котики OR', 'NEAR(', '*', 'text:кот'):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    reverse('posts:search'), {'q': query},
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идет по полнотекстовому индексу."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:posts_post_changelist'), {'q': 'собаки'},
+            )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.rare_post],
+        )
+        self.assertTrue(any(
+            'MATCH' in query['sql'] for query in queries.captured_queries
+        ))
+
+
+class AdminViewsTests(TestCase):
+    """Страницы админки не зависят по числу запросов от числа строк."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_superuser(
+            username='TestAdmin', email='admin@test.ru', password='password',
+        )
+        cls.group = Group.objects.create(
+            title='TestTitle',
+            slug='test_slug',
+            description='TestDescription',
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_changelist_queries_do_not_grow(self):
+        """Авторы, группы и посты выбираются в том же запросе."""
+        urls = (
+            reverse('admin:posts_post_changelist'),
+            reverse('admin:posts_comment_changelist'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self._create_posts(2)
+                with CaptureQueriesContext(connection) as few:
+                    self.client.get(url)
+                self._create_posts(5)
+                with CaptureQueriesContext(connection) as many:
+                    self.client.get(url)
+                self.assertEqual(len(few), len(many))
+
+    def test_changelist_count_is_estimated(self):
+        """Без фильтров число постов оценивается без COUNT(*)."""
+        posts = self._create_posts(3)
+        url = reverse('admin:posts_post_changelist')
+        threshold = EstimatedCountPaginator.exact_count_threshold
+        try:
+            EstimatedCountPaginator.exact_count_threshold = 0
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+        finally:
+            EstimatedCountPaginator.exact_count_threshold = threshold
+        self.assertEqual(response.context['cl'].result_count, posts[-1].pk)
+        self.assertFalse(any(
+            'COUNT(*)' in query['sql'] for query in queries.captured_queries
+        ))
+
+    def test_change_form_uses_autocomplete(self):
+        """Автор и группа выбираются через autocomplete."""
+        post = self._create_posts(1)[0]
+        response = self.client.get(
+            reverse('admin:posts_post_change', args=(post.pk,))
+        )
+        form = response.context['adminform'].form
+        for field in ('author', 'group'):
+            with self.subTest(field=field):
+                self.assertIsInstance(
+                    form.fields[field].widget.widget,
+                    AutocompleteSelect,
+                )
+        self.assertNotContains(
+            response,
+            f'<option value="{self.user.pk}">{self.user.username}</option>',
+        )
+
+    def _create_posts(self, count):
+        posts = []
+        for number in range(count):
+            author = User.objects.create_user(
+                username=f'TestAuthor{Post.objects.count()}'
+            )
+            post = Post.objects.create(
+                text=f'TestText{number}', author=author, group=self.group,
+            )
+            Comment.objects.create(post=post, author=author, text='Test')
+            posts.append(post)
+        return posts
+
+
+class CommentsViewsTests(TestCase):
+    """Постраничная загрузка комментариев к посту."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.post = Post.objects.create(text='TestText', author=cls.user)
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'TestUser{number}'),
+                text=f'TestComment{number}',
+            )
+            for number in range(settings.COMMENTS_PER_PAGE + 5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_shows_first_page(self):
+        """На странице поста только первая страница комментариев."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+            )
+        page = response.context['comments']
+        self.assertEqual(
+            list(page), self.comments[:settings.COMMENTS_PER_PAGE],
+        )
+        self.assertTrue(page.has_next)
+        self.assertContains(response, reverse(
+            'posts:comments', kwargs={'post_id': self.post.pk}
+        ))
+        self.assertLess(len(queries), settings.COMMENTS_PER_PAGE)
+
+    def test_comments_fragment(self):
+        """Следующие комментарии отдаются фрагментом по курсору."""
+        first_page = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        ).context['comments']
+        response = self.client.get(
+            reverse('posts:comments', kwargs={'post_id': self.post.pk}),
+            {'before': first_page.next_cursor},
+        )
+        self.assertEqual(
+            list(response.context['page_obj']),
+            self.comments[settings.COMMENTS_PER_PAGE:],
+        )
+        self.assertNotContains(response, '<html')
+        self.assertNotContains(response, 'js-more-comments')
+
+    def test_comments_fragment_unknown_post(self):
+        response = self.client.get(
+            reverse('posts:comments', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class ExportViewsTests(TestCase):
+    """Потоковая выгрузка постов пользователя."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.group = Group.objects.create(
+            title='TestTitle',
+            slug='test_slug',
+            description='TestDescription',
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'TestText{number}', author=cls.user, group=cls.group,
+            )
+            for number in range(3)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.user, text='Test',
+        )
+        Post.objects.create(
+            text='Other', author=User.objects.create_user('TestOther'),
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse(
+            'posts:profile_export',
+            kwargs={'username': self.user.get_username()},
+        )
+
+    def test_export_json(self):
+        response = self.client.get(self.url, {'format': 'json'})
+        self.assertTrue(response.streaming)
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(
+            [row['id'] for row in rows], [post.pk for post in self.posts],
+        )
+        self.assertEqual(rows[0]['group'], self.group.slug)
+        self.assertEqual(rows[0]['comments_count'], 1)
+
+    def test_export_csv(self):
+        response = self.client.get(self.url, {'format': 'csv'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            lines[0], 'id,pub_date,group,comments_count,text',
+        )
+        self.assertEqual(len(lines), len(self.posts) + 1)
+
+    def test_export_forbidden(self):
+        """Выгрузить можно только свои посты."""
+        other = User.objects.get(username='TestOther')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(
+            self.client.get(self.url, {'format': 'xml'}).status_code, 403,
+        )
+        self.client.force_login(self.user)
+        self.assertEqual(
+            self.client.get(self.url, {'format': 'xml'}).status_code, 404,
+        )
+
+    def test_export_links_only_on_own_profile(self):
+        profile = reverse(
+            'posts:profile', kwargs={'username': self.user.get_username()},
+        )
+        self.assertContains(self.client.get(profile), self.url, count=2)
+        self.client.force_login(User.objects.get(username='TestOther'))
+        self.assertNotContains(self.client.get(profile), self.url)
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command(
+            'export_posts', self.user.get_username(), stdout=out,
+        )
+        self.assertEqual(len(json.loads(out.getvalue())), len(self.posts))
+
+
+class FeedsViewsTests(TestCase):
+    """RSS/Atom-ленты главной, сообществ и авторов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.group = Group.objects.create(
+            title='TestTitle',
+            slug='test_slug',
+            description='TestDescription',
+        )
+        cls.post = Post.objects.create(
+            text='TestText', author=cls.user, group=cls.group,
+        )
+        cls.urls = [
+            reverse(name, kwargs=kwargs)
+            for kwargs, names in (
+                ({}, ('posts:index_rss', 'posts:index_atom')),
+                ({'slug': cls.group.slug},
+                 ('posts:group_rss', 'posts:group_atom')),
+                ({'username': cls.user.get_username()},
+                 ('posts:profile_rss', 'posts:profile_atom')),
+            )
+            for name in names
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_contain_posts(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'TestText')
+                self.assertIn('xml', response['Content-Type'])
+
+    @override_settings(FEED_ITEMS=2)
+    def test_feed_items_are_capped(self):
+        for number in range(3):
+            Post.objects.create(text=f'Extra{number}', author=self.user)
+        response = self.client.get(reverse('posts:index_rss'))
+        self.assertEqual(response.content.count(b'<item>'), 2)
+
+    def test_feeds_if_modified_since(self):
+        """Клиенты без ETag получают 304 по If-Modified-Since."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                last_modified = self.client.get(url)['Last-Modified']
+                with self.assertNumQueries(0):
+                    not_modified = self.client.get(
+                        url, HTTP_IF_MODIFIED_SINCE=last_modified,
+                    )
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertEqual(
+                    not_modified['Last-Modified'], last_modified,
+                )
+                modified = self.client.get(
+                    url,
+                    HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2001 00:00:00 GMT',
+                )
+                self.assertEqual(modified.status_code, 200)
+
+    def test_feeds_cached_and_invalidated(self):
+        """Ленты кешируются, поддерживают 304 и сбрасываются записью."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                Post.objects.filter(pk=self.post.pk).update(text='Changed')
+                with CaptureQueriesContext(connection) as queries:
+                    cached = self.client.get(url)
+                    not_modified = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=first['ETag'],
+                    )
+                self.assertEqual(cached.content, first.content)
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertEqual(len(queries), 0)
+                self.post.refresh_from_db()
+                self.post.text = 'TestText'
+                with execute_on_commit():
+                    self.post.save()
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=first['ETag'],
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_unknown_group_feed(self):
+        response = self.client.get(
+            reverse('posts:group_rss', kwargs={'slug': 'unknown'})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class LoadBenchTests(TransactionTestCase):
+    """Нагрузочный тест loadbench."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.output = os.path.join(directory, 'results.json')
+
+    def run_bench(self, **options):
+        call_command(
+            'loadbench', users=3, groups=2, posts=6, comments=1, follows=1,
+            requests=2, warmup=0, in_place=True, output=self.output,
+            stdout=StringIO(), stderr=StringIO(), **options,
+        )
+        with open(self.output) as file:
+            return json.load(file)
+
+    def test_covers_every_named_url(self):
+        results = self.run_bench()
+        expected = {
+            f'{name} {mode}'
+            for name, _ in named_urls() for mode in ('anon', 'auth')
+        }
+        self.assertEqual(set(results['scenarios']), expected)
+        for key, row in results['scenarios'].items():
+            with self.subTest(scenario=key):
+                self.assertEqual(row['requests'], 2)
+                self.assertLessEqual(row['p50_ms'], row['p95_ms'])
+                self.assertLessEqual(row['p95_ms'], row['p99_ms'])
+                self.assertFalse(
+                    [code for code in row['statuses'] if int(code) >= 500]
+                )
+        self.assertEqual(results['dataset']['posts'], 6)
+        self.assertEqual(results['total']['requests'], 2 * len(expected))
+
+    def test_baseline_regression(self):
+        results = self.run_bench(only=['posts:index'])
+        for row in results['scenarios'].values():
+            row['queries'] = 0
+        baseline = self.output + '.baseline'
+        with open(baseline, 'w') as file:
+            json.dump(results, file)
+        User.objects.filter(username__startswith='bench-').delete()
+        with self.assertRaisesMessage(CommandError, 'posts:index auth'):
+            self.run_bench(only=['posts:index'], baseline=baseline)
@@ -0,0 +1,155 @@
+import hashlib
+import logging
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from sorl.thumbnail import get_thumbnail
+
+from .cache import bump_versions
+
+logger = logging.getLogger(__name__)
+
+READY_KEY_PREFIX = 'posts:thumbnail'
+PENDING_KEY_PREFIX = 'posts:thumbnail-pending'
+# Через сколько секунд повторить создание, если задача не отчиталась.
+PENDING_TIMEOUT = 5 * 60
+
+# Все размеры миниатюр, которые используются в шаблонах.
+THUMBNAIL_GEOMETRIES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+Thumbnail = namedtuple('Thumbnail', ('url',))
+
+_executor = None
+# Соединения с БД, унаследованные процессом пула после fork.
+_inherited_connections = []
+
+
+def _image_name(image):
+    return getattr(image, 'name', image)
+
+
+def _ready_key(image_name, alias):
+    digest = hashlib.md5(image_name.encode()).hexdigest()
+    return f'{READY_KEY_PREFIX}:{alias}:{digest}'
+
+
+def _pending_key(image_name):
+    digest = hashlib.md5(image_name.encode()).hexdigest()
+    return f'{PENDING_KEY_PREFIX}:{digest}'
+
+
+def get_ready_thumbnail(image, alias):
+    """Возвращает готовую миниатюру или None, никогда не генерируя ее."""
+    return get_ready_thumbnails([image], (alias,)).get(
+        (_image_name(image), alias)
+    )
+
+
+def get_ready_thumbnails(images, aliases, namespaces=None):
+    """Готовые миниатюры сразу для нескольких картинок.
+
+    Адреса готовых миниатюр хранятся в кеше и читаются одним
+    ``get_many``. ``images`` - файлы из ``ImageField`` или имена файлов.
+    Возвращает словарь ``{(имя, алиас): миниатюра}`` без картинок,
+    миниатюры которых еще не готовы.
+
+    ``namespaces`` - словарь ``{имя: пространства имен страниц}``. Для
+    его картинок без готовых миниатюр создание ставится в очередь, так
+    что миниатюры появляются и у постов из админки, импорта и старых
+    записей, а упавшая задача повторяется при следующем промахе.
+    """
+    keys = {}
+    for image in images:
+        if not image:
+            continue
+        for alias in aliases:
+            name = _image_name(image)
+            keys[_ready_key(name, alias)] = (name, alias)
+    if not keys:
+        return {}
+    values = cache.get_many(list(keys))
+    if namespaces:
+        missing = {
+            keys[key][0] for key in keys if key not in values
+        } & namespaces.keys()
+        for name in sorted(missing):
+            request_thumbnails(name, namespaces[name])
+    return {keys[key]: Thumbnail(url) for key, url in values.items()}
+
+
+def generate_thumbnails(image_name, namespaces=()):
+    """Создает миниатюры всех размеров и сбрасывает кеш страниц поста.
+
+    Возвращает False, если миниатюры создать не удалось: тогда они не
+    отмечаются готовыми и запрашиваются снова после ``PENDING_TIMEOUT``.
+    """
+    ready = {}
+    for alias, (geometry, options) in THUMBNAIL_GEOMETRIES.items():
+        thumbnail = get_thumbnail(image_name, geometry, **options)
+        # Без исходного файла sorl возвращает несуществующую миниатюру.
+        if not thumbnail.exists():
+            logger.warning('Не удалось создать миниатюры: %s', image_name)
+            return False
+        ready[_ready_key(image_name, alias)] = thumbnail.url
+    cache.set_many(ready, None)
+    cache.delete(_pending_key(image_name))
+    bump_versions(namespaces)
+    return True
+
+
+def _init_worker():
+    # Сокеты соединений, унаследованных после fork, общие с родительским
+    # процессом: их нельзя ни использовать, ни закрывать (закрытие
+    # завершило бы сессию родителя на сервере PostgreSQL). Django
+    # откроет новые соединения, а ссылки на старые остаются, чтобы их
+    # не закрыл сборщик мусора.
+    for conn in connections.all():
+        if conn.connection is not None:
+            _inherited_connections.append(conn.connection)
+            conn.connection = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            initializer=_init_worker,
+        )
+    return _executor
+
+
+def _log_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.error('Не удалось создать миниатюры: %s', error)
+
+
+def schedule_thumbnails(image_name, namespaces=()):
+    """Ставит генерацию миниатюр в очередь пула процессов.
+
+    При ``THUMBNAIL_WORKERS = 0`` миниатюры создаются сразу.
+    """
+    if not settings.THUMBNAIL_WORKERS:
+        generate_thumbnails(image_name, namespaces)
+        return
+    future = _get_executor().submit(
+        generate_thumbnails, image_name, list(namespaces),
+    )
+    future.add_done_callback(_log_failure)
+
+
+def request_thumbnails(image_name, namespaces=()):
+    """Ставит генерацию в очередь, если она еще не запрошена.
+
+    Отметка о запросе живет ``PENDING_TIMEOUT`` секунд, поэтому
+    одновременные промахи не создают дублей, а после сбоя задача
+    запрашивается снова.
+    """
+    if cache.add(_pending_key(image_name), True, PENDING_TIMEOUT):
+        schedule_thumbnails(image_name, namespaces)
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import feeds, views
 
 app_name = 'posts'
 
@@ -10,6 +10,16 @@ urlpatterns = [
         views.IndexListView.as_view(),
         name='index'
     ),
+    path(
+        'rss/',
+        feeds.IndexFeed(),
+        name='index_rss',
+    ),
+    path(
+        'atom/',
+        feeds.AtomIndexFeed(),
+        name='index_atom',
+    ),
     path(
         'create/',
         views.PostCreateView.as_view(),
@@ -25,6 +35,26 @@ urlpatterns = [
         views.GroupListView.as_view(),
         name='group_list'
     ),
+    path(
+        'group/<slug:slug>/rss/',
+        feeds.GroupFeed(),
+        name='group_rss',
+    ),
+    path(
+        'group/<slug:slug>/atom/',
+        feeds.AtomGroupFeed(),
+        name='group_atom',
+    ),
+    path(
+        'profile/<str:username>/rss/',
+        feeds.ProfileFeed(),
+        name='profile_rss',
+    ),
+    path(
+        'profile/<str:username>/atom/',
+        feeds.AtomProfileFeed(),
+        name='profile_atom',
+    ),
     path(
         'posts/<int:post_id>/',
         views.PostDetailView.as_view(),
@@ -35,16 +65,31 @@ urlpatterns = [
         views.PostEditView.as_view(),
         name='post_edit'
     ),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.CommentListView.as_view(),
+        name='comments',
+    ),
     path(
         'posts/<int:post_id>/comment/',
         views.AddCommentView.as_view(),
         name='add_comment'
     ),
+    path(
+        'search/',
+        views.PostSearchView.as_view(),
+        name='search',
+    ),
     path(
         'follow/',
         views.FollowListView.as_view(),
         name='follow_index',
     ),
+    path(
+        'profile/<str:username>/export/',
+        views.ProfileExportView.as_view(),
+        name='profile_export',
+    ),
     path(
         'profile/<str:username>/follow/',
         views.ProfileFollowView.as_view(),
@@ -1,10 +1,117 @@
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import redirect
 from django.views.generic.detail import SingleObjectMixin
 
+from .cache import cached_count, post_namespaces
+from .paginators import CursorPaginator, InvalidCursor, WindowedPaginator
+from .thumbnails import get_ready_thumbnails, schedule_thumbnails
+
 
 class AuthorRequiredMixin(SingleObjectMixin):
     def dispatch(self, request, *args, **kwargs):
         obj = self.get_object()
-        if obj.author != request.user:
+        if obj.author_id != request.user.pk:
             return redirect(obj)
-        return super().dispatch(request, *args, **kwargs)
\ No newline at end of file
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_object(self, queryset=None):
+        # Объект уже загружен в dispatch, повторно его не запрашиваем.
+        if queryset is None and hasattr(self, '_object'):
+            return self._object
+        obj = super().get_object(queryset)
+        if queryset is None:
+            self._object = obj
+        return obj
+
+
+class CursorPaginationMixin:
+    """Keyset-пагинация для ListView по параметрам ``?before=``/``?after=``.
+
+    Режим включается атрибутом ``cursor_pagination`` или наличием
+    курсора в запросе, иначе работает обычная постраничная пагинация.
+    """
+    cursor_pagination = False
+    cursor_paginator_class = CursorPaginator
+    cursor_ordering = ('-pub_date', '-id')
+
+    def use_cursor_pagination(self) -> bool:
+        params = self.request.GET
+        return (
+            self.cursor_pagination
+            or 'before' in params
+            or 'after' in params
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = self.cursor_paginator_class(
+            queryset,
+            page_size,
+            ordering=self.cursor_ordering,
+        )
+        try:
+            page = paginator.page(
+                before=self.request.GET.get('before'),
+                after=self.request.GET.get('after'),
+            )
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+
+class WindowedPaginationMixin:
+    """Постраничная пагинация с окном номеров страниц.
+
+    У закешированных страниц (``VersionedCacheMixin``) число объектов
+    тоже берется из кеша и пересчитывается только после записи, поэтому
+    ``COUNT(*)`` не выполняется на каждый запрос.
+    """
+    paginator_class = WindowedPaginator
+
+    def get_total_count(self, queryset):
+        if not hasattr(self, 'get_cache_namespaces'):
+            return None
+        return cached_count(self.get_cache_namespaces(), queryset)
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        return super().get_paginator(
+            queryset, per_page, count=self.get_total_count(queryset),
+            **kwargs
+        )
+
+
+class ThumbnailsMixin:
+    """Ставит в очередь создание миниатюр загруженной картинки поста."""
+
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        if 'image' in form.changed_data and self.object.image:
+            image_name = self.object.image.name
+            namespaces = post_namespaces(self.object)
+            transaction.on_commit(
+                lambda: schedule_thumbnails(image_name, namespaces)
+            )
+        return response
+
+
+class ThumbnailsPrefetchMixin:
+    """Загружает готовые миниатюры всех постов страницы одним запросом
+    к кешу и ставит в очередь создание недостающих."""
+    thumbnail_aliases = ('card',)
+
+    def get_thumbnail_posts(self, context):
+        return context['page_obj']
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        posts = [
+            post for post in self.get_thumbnail_posts(context) if post.image
+        ]
+        context['thumbnails'] = get_ready_thumbnails(
+            [post.image for post in posts],
+            self.thumbnail_aliases,
+            {post.image.name: post_namespaces(post) for post in posts},
+        )
+        return context
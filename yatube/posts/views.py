@@ -1,27 +1,50 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse, reverse_lazy
-from django.views.generic.base import RedirectView
+from django.views.generic.base import RedirectView, View
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, UpdateView, FormView
 from django.views.generic.list import ListView
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
-
-
-from .forms import PostForm, CommentForm
+from django.utils.functional import cached_property
+
+from .cache import (
+    POST_AUTHOR_KEY_PREFIX, VersionedCacheMixin, cards_namespace,
+    group_namespace, index_namespace, post_namespace, profile_namespace,
+    versioned_value,
+)
+from .forms import PostForm, CommentForm, PostSearchForm
 from .models import Post, Group, Comment, User, Follow
-from .utils import AuthorRequiredMixin
-
-
-@method_decorator(cache_page(20, key_prefix='index_page'), name='dispatch')
-class IndexListView(ListView):
+from .paginators import CursorPaginator
+from .export import EXPORT_FORMATS, export_rows
+from .feed import get_request_feed_unread, mark_feed_seen
+from .search import search_posts
+from .utils import (
+    AuthorRequiredMixin, CursorPaginationMixin, ThumbnailsMixin,
+    ThumbnailsPrefetchMixin, WindowedPaginationMixin,
+)
+
+
+class IndexListView(
+    VersionedCacheMixin, CursorPaginationMixin, WindowedPaginationMixin,
+    ThumbnailsPrefetchMixin, ListView,
+):
     """Главная страница, на которой отображаются все посты пользователей."""
-    model = Post
     paginate_by = settings.POSTS_PER_PAGE
+    cursor_pagination = settings.POSTS_CURSOR_PAGINATION
     template_name = 'posts/index.html'
+    queryset = Post.objects.select_related('author', 'group')
+    query_budget = 5
+    shows_feed_unread = True
+
+    def get_cache_namespaces(self):
+        return [index_namespace(), cards_namespace()]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -29,14 +52,22 @@ class IndexListView(ListView):
         return context
 
 
-class GroupListView(ListView):
+class GroupListView(
+    VersionedCacheMixin, CursorPaginationMixin, WindowedPaginationMixin,
+    ThumbnailsPrefetchMixin, ListView,
+):
     """Страница с постами определенной группы."""
     paginate_by = settings.POSTS_PER_PAGE
+    cursor_pagination = settings.POSTS_CURSOR_PAGINATION
     template_name = 'posts/group_list.html'
+    query_budget = 5
+
+    def get_cache_namespaces(self):
+        return [group_namespace(self.kwargs['slug']), cards_namespace()]
 
     def get_queryset(self):
         self.group = get_object_or_404(Group, slug=self.kwargs['slug'])
-        return self.group.posts.all()
+        return self.group.posts.select_related('author', 'group')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -44,48 +75,159 @@ class GroupListView(ListView):
         return context
 
 
-class ProfileListView(ListView):
+class ProfileListView(
+    VersionedCacheMixin, CursorPaginationMixin, WindowedPaginationMixin,
+    ThumbnailsPrefetchMixin, ListView,
+):
     """Страница-profile определенного юзера."""
     paginate_by = settings.POSTS_PER_PAGE
+    cursor_pagination = settings.POSTS_CURSOR_PAGINATION
     template_name = 'posts/profile.html'
+    query_budget = 6
+
+    def get_cache_namespaces(self):
+        return [profile_namespace(self.kwargs['username']), cards_namespace()]
 
     def get_queryset(self):
-        self.author = get_object_or_404(User, username=self.kwargs['username'])
-        return self.author.posts.all()
+        self.author = get_object_or_404(
+            User.objects.select_related('counters'),
+            username=self.kwargs['username'],
+        )
+        return self.author.posts.select_related('author', 'group')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['author'] = self.author
-        context['following'] = self.is_follow()
+        context['following'] = self.following
         return context
 
-    def is_follow(self) -> bool:
+    def get_hole_context(self):
+        return {'following': self.following}
+
+    @cached_property
+    def following(self) -> bool:
         if not self.request.user.is_authenticated:
             return False
         return Follow.objects.filter(
             user=self.request.user,
-            author=self.author,
+            author__username=self.kwargs['username'],
         ).exists()
 
 
-class PostDetailView(DetailView):
+class PostSearchView(
+    VersionedCacheMixin, WindowedPaginationMixin, ThumbnailsPrefetchMixin,
+    ListView,
+):
+    """Полнотекстовый поиск по постам с фильтрами по группе и автору."""
+    paginate_by = settings.POSTS_PER_PAGE
+    template_name = 'posts/search.html'
+    query_budget = 5
+
+    def get_cache_namespaces(self):
+        # Результаты меняются вместе с любым постом, как и главная.
+        return [index_namespace(), cards_namespace()]
+
+    def get_form(self):
+        if not hasattr(self, 'form'):
+            self.form = PostSearchForm(self.request.GET or None)
+        return self.form
+
+    def get_queryset(self):
+        form = self.get_form()
+        if not form.is_valid() or not form.cleaned_data['q']:
+            return Post.objects.none()
+        queryset = Post.objects.select_related('author', 'group')
+        if form.cleaned_data['group'] is not None:
+            queryset = queryset.filter(group=form.cleaned_data['group'])
+        if form.cleaned_data['author']:
+            queryset = queryset.filter(
+                author__username=form.cleaned_data['author'],
+            )
+        return search_posts(queryset, form.cleaned_data['q'])
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.copy()
+        query.pop('page', None)
+        context['form'] = self.get_form()
+        context['page_query'] = query.urlencode() + '&' if query else ''
+        return context
+
+
+class PostDetailView(
+    VersionedCacheMixin, ThumbnailsPrefetchMixin, DetailView,
+):
     """Подробная страница определенного поста."""
     model = Post
     template_name = 'posts/post_detail.html'
     context_object_name = 'post'
     pk_url_kwarg = 'post_id'
+    queryset = Post.objects.select_related('author__counters', 'group')
+    query_budget = 5
+
+    def get_cache_namespaces(self):
+        # На странице выводится число постов автора, поэтому она
+        # зависит и от версии профиля. Автор хранится в кеше под версией
+        # поста, чтобы условный GET обходился без запросов к БД.
+        post_id = self.kwargs['post_id']
+        username = versioned_value(
+            f'{POST_AUTHOR_KEY_PREFIX}:{post_id}',
+            [post_namespace(post_id)],
+            lambda: Post.objects.filter(
+                pk=post_id,
+            ).values_list('author__username', flat=True).first(),
+        )
+        return [
+            post_namespace(post_id), profile_namespace(username),
+            cards_namespace(),
+        ]
+
+    def get_hole_context(self):
+        return {'form': CommentForm()}
+
+    def get_thumbnail_posts(self, context):
+        return [self.object]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['comments'] = self.object.comments.all()
+        context['comments'] = CursorPaginator(
+            self.object.comments.select_related('author'),
+            settings.COMMENTS_PER_PAGE,
+            ordering=CommentListView.cursor_ordering,
+        ).page()
         context['form'] = CommentForm()
         return context
 
 
-class PostCreateView(LoginRequiredMixin, CreateView):
+class CommentListView(VersionedCacheMixin, CursorPaginationMixin, ListView):
+    """Фрагмент со следующей страницей комментариев к посту."""
+    paginate_by = settings.COMMENTS_PER_PAGE
+    cursor_pagination = True
+    cursor_ordering = ('created', 'id')
+    template_name = 'posts/includes/comment_list.html'
+    query_budget = 4
+
+    def get_cache_namespaces(self):
+        return [post_namespace(self.kwargs['post_id'])]
+
+    def get_queryset(self):
+        post = get_object_or_404(
+            Post.objects.only('pk'), pk=self.kwargs['post_id'],
+        )
+        return post.comments.select_related('author')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['post_id'] = self.kwargs['post_id']
+        return context
+
+
+@method_decorator(transaction.atomic, name='post')
+class PostCreateView(LoginRequiredMixin, ThumbnailsMixin, CreateView):
     """Страница создания нового поста."""
     template_name = 'posts/create_post.html'
     form_class = PostForm
+    query_budget = 3
 
     def get_success_url(self):
         return reverse(
@@ -103,12 +245,16 @@ class PostCreateView(LoginRequiredMixin, CreateView):
         return context
 
 
-class PostEditView(LoginRequiredMixin, AuthorRequiredMixin, UpdateView):
+@method_decorator(transaction.atomic, name='post')
+class PostEditView(
+    LoginRequiredMixin, AuthorRequiredMixin, ThumbnailsMixin, UpdateView
+):
     """Страница редактирования определенного поста."""
     model = Post
     template_name = 'posts/create_post.html'
     form_class = PostForm
     pk_url_kwarg = 'post_id'
+    query_budget = 4
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -116,6 +262,7 @@ class PostEditView(LoginRequiredMixin, AuthorRequiredMixin, UpdateView):
         return context
 
 
+@method_decorator(transaction.atomic, name='post')
 class AddCommentView(LoginRequiredMixin, CreateView):
     """Создание нового комментария к посту."""
     http_method_names = ['post']
@@ -128,14 +275,34 @@ class AddCommentView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
-class FollowListView(LoginRequiredMixin, ListView):
+class FollowListView(
+    LoginRequiredMixin, CursorPaginationMixin, WindowedPaginationMixin,
+    ThumbnailsPrefetchMixin, ListView,
+):
     """Страница с постами авторов, на который подписан пользователь."""
     model = Post
     paginate_by = settings.POSTS_PER_PAGE
+    cursor_pagination = settings.POSTS_CURSOR_PAGINATION
     template_name = 'posts/follow.html'
+    query_budget = 6
+    cursor_ordering = ('-feed_pub_date', '-feed_post_id')
+
+    def get(self, request, *args, **kwargs):
+        # Просмотр ленты сбрасывает счетчик новых постов на вкладке.
+        if get_request_feed_unread(request):
+            mark_feed_seen(request.user.pk)
+            request._feed_unread = 0
+        return super().get(request, *args, **kwargs)
 
     def get_queryset(self):
-        return Post.objects.filter(author__following__user=self.request.user)
+        # Сортировка по полям записи ленты, а не поста: тогда порядок и
+        # LIMIT обслуживает индекс ленты без сортировки всех ее записей.
+        return Post.objects.filter(
+            feed_entries__user=self.request.user,
+        ).annotate(
+            feed_pub_date=F('feed_entries__pub_date'),
+            feed_post_id=F('feed_entries__post'),
+        ).select_related('author', 'group').order_by(*self.cursor_ordering)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -143,6 +310,32 @@ class FollowListView(LoginRequiredMixin, ListView):
         return context
 
 
+class ProfileExportView(LoginRequiredMixin, View):
+    """Потоковая выгрузка всех постов пользователя в JSON или CSV.
+
+    Посты читаются из БД чанками и сразу отдаются клиенту, поэтому
+    расход памяти не зависит от их количества.
+    """
+    query_budget = 3
+
+    def get(self, request, *args, **kwargs):
+        if request.user.get_username() != self.kwargs['username']:
+            raise PermissionDenied
+        export_format = request.GET.get('format', 'json')
+        if export_format not in EXPORT_FORMATS:
+            raise Http404('Неизвестный формат выгрузки.')
+        content_type, renderer = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            renderer(export_rows(request.user)),
+            content_type=f'{content_type}; charset=utf-8',
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="posts.{export_format}"'
+        )
+        return response
+
+
+@method_decorator(transaction.atomic, name='get')
 class ProfileFollowView(LoginRequiredMixin, RedirectView):
     """Создание подписки на определенного автора."""
     pattern_name = 'posts:profile'
@@ -160,6 +353,7 @@ class ProfileFollowView(LoginRequiredMixin, RedirectView):
             )
 
 
+@method_decorator(transaction.atomic, name='get')
 class ProfileUnFollowView(LoginRequiredMixin, RedirectView):
     """Отмена подписки на определенного автора."""
     pattern_name = 'posts:profile'
@@ -46,10 +46,13 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,18 +62,31 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Общий для всех воркеров кеш в файле SQLite (WAL)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
+# Тесты не должны трогать файл кеша сайта
+TEST_RUNNER = 'core.testing.IsolatedCacheRunner'
+
+# Страницы постов инвалидируются сигналами, поэтому живут долго
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени рендеринга для /metrics/
+        'BACKEND': 'core.metrics.TimedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -163,6 +179,68 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POSTS_PER_PAGE = 10
 
+# Keyset-пагинация (?before=/?after=) вместо ?page=N для всех лент постов
+POSTS_CURSOR_PAGINATION = False
+
+# Комментарии под постом подгружаются страницами по курсору
+COMMENTS_PER_PAGE = 20
+
+
+# Thumbnails
+
+# Число процессов для фоновой генерации миниатюр (0 - создавать сразу)
+THUMBNAIL_WORKERS = 2
+
+
+# Follow feed
+
+# Максимум записей в материализованной ленте подписок одного пользователя
+FEED_MAX_ENTRIES = 1000
+
+
+# API
+
+# Максимум постов в одном ответе delta-sync
+SYNC_MAX_ITEMS = 100
+
+
+# Syndication
+
+# Число записей в RSS/Atom-лентах
+FEED_ITEMS = 20
+
+
+# Metrics
+
+# Каталог, куда процессы сбрасывают свои метрики для /metrics/
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+# Как часто (в секундах) процесс сбрасывает метрики на диск
+METRICS_FLUSH_INTERVAL = 10
+# С каких адресов можно читать /metrics/
+METRICS_ALLOWED_IPS = ['127.0.0.1']
+
+
+# Slow queries
+
+# Запросы дольше этого времени (в секундах) попадают в журнал
+# медленных запросов (None - выключено)
+SLOW_QUERY_THRESHOLD = 0.2
+
+
+# Profiling
+
+# Доля запросов, которые профилируются (0 - выключено)
+PROFILING_SAMPLE_RATE = 0.0
+# Префиксы путей, запросы к которым профилируются всегда
+PROFILING_PATHS = []
+# Значение заголовка X-Profile, включающего профилирование запроса
+PROFILING_HEADER_TOKEN = ''
+# Каталог профилей и сколько последних файлов в нем хранить
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILING_MAX_FILES = 200
+# Как часто (в секундах) процесс сохраняет накопленные профили
+PROFILING_FLUSH_INTERVAL = 60
+
 
 # Testing
 